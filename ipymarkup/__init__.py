@@ -1,13 +1,88 @@
 
-from .span import format_span_box_markup, show_span_box_markup  # noqa
-from .span import format_span_line_markup, show_span_line_markup  # noqa
-from .span import format_span_ascii_markup, show_span_ascii_markup  # noqa
-
-from .dep import format_dep_markup, show_dep_markup  # noqa
-from .dep import format_dep_ascii_markup, show_dep_ascii_markup  # noqa
+# Submodules are imported on first access to their names, so cold
+# start pays only for formatters that are used
 
+EXPORTS = {
+    'span': [
+        'format_span_box_markup', 'show_span_box_markup',
+        'format_span_line_markup', 'show_span_line_markup',
+        'format_span_svg_markup', 'show_span_svg_markup',
+        'format_span_ascii_markup', 'show_span_ascii_markup',
+        'format_span_ansi_markup', 'show_span_ansi_markup',
+        'stream_span_line_markup', 'stream_span_ascii_markup',
+        'page_span_box_markup', 'page_span_line_markup',
+        'write_span_box_markup', 'write_span_line_markup',
+        'write_span_svg_markup', 'write_span_ascii_markup',
+    ],
+    'dep': [
+        'format_dep_markup', 'show_dep_markup',
+        'format_dep_svg_markup', 'show_dep_svg_markup',
+        'format_dep_ascii_markup', 'show_dep_ascii_markup',
+        'format_dep_ansi_markup', 'show_dep_ansi_markup',
+        'page_dep_markup',
+        'write_dep_markup', 'write_dep_svg_markup',
+        'write_dep_ascii_markup',
+    ],
+    'incremental': [
+        'LineMarkup',
+    ],
+    'diff': [
+        'SpanDiff', 'diff_spans', 'count_span_diffs',
+        'format_span_diff_markup', 'show_span_diff_markup',
+        'format_span_diff_ascii_markup', 'show_span_diff_ascii_markup',
+    ],
+    'stats': [
+        'RenderStats', 'render_stats',
+        'add_stats_hook', 'remove_stats_hook',
+    ],
+    'batch': [
+        'format_span_box_markup_many',
+        'format_span_line_markup_many',
+        'format_span_ascii_markup_many',
+        'format_dep_markup_many',
+        'format_dep_ascii_markup_many',
+        'format_span_diff_markup_many',
+        'format_span_diff_ascii_markup_many',
+    ],
+}
 
 # legacy
-show_box_markup = show_span_box_markup
-show_line_markup = show_span_line_markup
-show_ascii_markup = show_span_ascii_markup
+ALIASES = {
+    'show_box_markup': 'show_span_box_markup',
+    'show_line_markup': 'show_span_line_markup',
+    'show_ascii_markup': 'show_span_ascii_markup',
+}
+
+MODULES = {
+    name: module
+    for module, names in EXPORTS.items()
+    for name in names
+}
+
+SUBMODULES = [
+    'span', 'dep', 'palette', 'record', 'show', 'css', 'demo',
+    'ansi', 'stats', 'batch', 'cache', 'incremental', 'diff', 'bench',
+]
+
+__all__ = list(MODULES) + list(ALIASES)
+
+
+def __getattr__(name):
+    from importlib import import_module
+
+    if name in SUBMODULES:
+        # ipymarkup.span worked when submodules were imported eagerly
+        return import_module('.' + name, __name__)
+
+    target = ALIASES.get(name, name)
+    if target not in MODULES:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+    module = import_module('.' + MODULES[target], __name__)
+    value = getattr(module, target)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(SUBMODULES))
@@ -0,0 +1,452 @@
+
+import os
+import sys
+import json
+from html import escape
+from hashlib import sha1
+from itertools import islice, count
+from collections import deque
+from argparse import ArgumentParser
+
+from .span import (
+    format_span_box_markup,
+    format_span_line_markup,
+    format_span_svg_markup
+)
+from .dep import (
+    format_dep_markup,
+    format_dep_svg_markup
+)
+from .palette import PALETTE
+from .batch import (
+    format_many,
+    SPAN_FORMATS
+)
+from .cache import (
+    prepare_markup,
+    render_key,
+    RenderCache
+)
+
+
+# python -m ipymarkup docs.jsonl out/ renders docs into out/00001.html,
+# out/00002.html, ... and out/index.html. Page hashes are kept in
+# out/manifest.json, next run rebuilds only pages which docs, options or
+# colors changed, interrupted run continues from last saved page. Doc
+# markup is kept in out/.cache by render key, only changed docs of
+# rebuilt page are rendered
+
+
+FORMATS = {
+    'box': format_span_box_markup,
+    'line': format_span_line_markup,
+    'svg': format_span_svg_markup,
+    'dep': format_dep_markup,
+    'dep-svg': format_dep_svg_markup
+}
+WIDTH_FORMATS = [
+    format_span_line_markup,
+    format_span_svg_markup
+]
+
+JSONL = 'jsonl'
+CONLLU = 'conllu'
+
+MANIFEST = 'manifest.json'
+INDEX = 'index.html'
+CACHE = '.cache'
+
+
+#######
+#
+#   READ
+#
+#####
+
+
+def read_jsonl(lines, dep=False):
+    # {"id": ..., "text": ..., "spans": [[start, stop, type], ...]} or
+    # {"id": ..., "words": [...], "deps": [[source, target, type], ...]}
+    for index, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        id = str(item.get('id', index))
+        if dep:
+            yield id, (item['words'], item.get('deps', []))
+        else:
+            spans = [
+                (_['start'], _['stop'], _.get('type'))
+                if isinstance(_, dict) else _
+                for _ in item.get('spans', [])
+            ]
+            yield id, (item['text'], spans)
+
+
+def parse_conllu(id, rows):
+    words, deps = [], []
+    for row in rows:
+        words.append(row[1])
+        head = int(row[6]) if row[6] != '_' else 0
+        if head:  # root is not drawn
+            deps.append((head - 1, len(words) - 1, row[7]))
+    return id, (words, deps)
+
+
+def read_conllu(lines):
+    id, rows, index = None, [], 0
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            if rows:
+                index += 1
+                yield parse_conllu(id or str(index), rows)
+            id, rows = None, []
+        elif line.startswith('#'):
+            if line.startswith('# sent_id'):
+                _, _, id = line.partition('=')
+                id = id.strip()
+        else:
+            row = line.split('\t')
+            if '-' in row[0] or '.' in row[0]:
+                continue  # multiword and empty tokens
+            rows.append(row)
+
+    if rows:
+        index += 1
+        yield parse_conllu(id or str(index), rows)
+
+
+#######
+#
+#   PAGE
+#
+######
+
+
+class Page(object):
+    __slots__ = ['index', 'ids', 'keys', 'docs', 'hash', 'last']
+
+    def __init__(self, index, ids, keys, docs, hash, last=False):
+        self.index = index
+        self.ids = ids
+        self.keys = keys
+        self.docs = docs
+        self.hash = hash
+        self.last = last
+
+    @property
+    def name(self):
+        return page_name(self.index)
+
+
+def page_name(index):
+    return '%05d.html' % (index + 1)
+
+
+def doc_pages(docs, format, size, kwargs):
+    # hash of page is hash of its docs render keys, docs are prepared
+    # and palette colors assigned in docs order. Last page is known
+    # after next one is read, only two pages are kept in memory
+    docs = iter(docs)
+    previous = None
+    for index in count():
+        chunk = list(islice(docs, size))
+        if not chunk:
+            break
+
+        ids, keys, items, hash = [], [], [], sha1()
+        for id, (data, markup) in chunk:
+            markup, colors = prepare_markup(format, markup, kwargs)
+            key = render_key(format, data, markup, colors, kwargs)
+            hash.update(repr((id, key)).encode('utf8'))
+            ids.append(id)
+            keys.append(key)
+            items.append((data, markup))
+
+        if previous:
+            yield previous
+        previous = Page(index, ids, keys, items, hash)
+
+    if previous:
+        previous.last = True
+        yield previous
+
+
+def page_hash(page):
+    hash = page.hash.copy()
+    hash.update(repr((page.index, page.last)).encode('utf8'))
+    return hash.hexdigest()
+
+
+#######
+#
+#   HTML
+#
+######
+
+
+HTML_OPEN = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{font-family: sans-serif; margin: 2em}}
+.doc {{margin: 2em 0}}
+.id {{color: #999; font-size: 12px; margin-bottom: 4px}}
+</style>
+</head>
+<body>
+'''
+HTML_CLOSE = '''</body>
+</html>
+'''
+
+
+def format_nav(page):
+    links = []
+    if page.index:
+        links.append('<a href="%s">prev</a>' % page_name(page.index - 1))
+    links.append('<a href="%s">index</a>' % INDEX)
+    if not page.last:
+        links.append('<a href="%s">next</a>' % page_name(page.index + 1))
+    return '<p>%s</p>\n' % ' | '.join(links)
+
+
+def format_page(page, markups):
+    yield HTML_OPEN.format(title='Page %d' % (page.index + 1))
+    yield format_nav(page)
+    for id, markup in zip(page.ids, markups):
+        yield '<div class="doc" id="%s">' % escape(id)
+        yield '<div class="id">%s</div>' % escape(id)
+        yield markup
+        yield '</div>\n'
+    yield format_nav(page)
+    yield HTML_CLOSE
+
+
+def format_index(pages):
+    yield HTML_OPEN.format(title='Index')
+    yield '<table>\n'
+    for record in pages:
+        yield (
+            '<tr><td><a href="{name}">{name}</a></td>'
+            '<td>{count}</td><td>{first}</td><td>{last}</td></tr>\n'.format(
+                name=record['name'],
+                count=record['count'],
+                first=escape(record['first']),
+                last=escape(record['last'])
+            )
+        )
+    yield '</table>\n'
+    yield HTML_CLOSE
+
+
+#######
+#
+#   WRITE
+#
+######
+
+
+def write_file(path, lines):
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'w', encoding='utf8') as file:
+        file.write(''.join(lines))
+    os.replace(tmp, path)
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding='utf8') as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        return {}
+    return {_['name']: _ for _ in data['pages']}
+
+
+def dump_manifest(path, pages):
+    data = json.dumps({'pages': pages}, ensure_ascii=False, indent=1)
+    write_file(path, [data])
+
+
+def page_record(page):
+    return {
+        'name': page.name,
+        'hash': page_hash(page),
+        'count': len(page.ids),
+        'first': page.ids[0],
+        'last': page.ids[-1],
+        'keys': page.keys
+    }
+
+
+class Build(object):
+    # Pages with same hash and existing file are skipped. Other pages
+    # take doc markup from cache, docs not in cache go to format_many,
+    # results come in docs order and fill slots of pending pages.
+    # Manifest is saved every flush pages written, pages not reached
+    # yet keep old records
+
+    def __init__(self, dir, flush=64):
+        self.dir = dir
+        self.flush = flush
+        self.manifest = load_manifest(self.path(MANIFEST))
+        self.cache = RenderCache(size=0, path=self.path(CACHE))
+        self.pages = []  # records in page order
+        self.records = {}  # name -> record, known to be on disk
+        self.pending = deque()  # page, record, markups, missing slots
+        self.written = 0
+        self.skipped = 0
+        self.rendered = 0
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def fresh(self, page, record):
+        old = self.manifest.get(page.name)
+        return (
+            old is not None
+            and old['hash'] == record['hash']
+            and os.path.exists(self.path(page.name))
+        )
+
+    def changed(self, pages):
+        for page in pages:
+            record = page_record(page)
+            self.pages.append(record)
+            if self.fresh(page, record):
+                self.records[page.name] = record
+                self.skipped += 1
+                continue
+
+            markups = [self.cache.load(_) for _ in page.keys]
+            missing = deque(
+                index for index, markup in enumerate(markups)
+                if markup is None
+            )
+            if not missing:
+                self.write(page, record, markups)
+                continue
+
+            self.pending.append((page, record, markups, missing))
+            for index in list(missing):  # consumed while results come
+                yield page.docs[index]
+            page.docs = None
+
+    def write(self, page, record, markups):
+        write_file(self.path(page.name), format_page(page, markups))
+        self.records[page.name] = record
+        self.written += 1
+        if self.written % self.flush == 0:
+            self.save()
+
+    def save(self):
+        records = dict(self.manifest, **self.records)
+        pages = [records[_] for _ in sorted(records)]
+        dump_manifest(self.path(MANIFEST), pages)
+
+    def run(self, format, docs, page_size, workers, kwargs):
+        os.makedirs(self.dir, exist_ok=True)
+        pages = doc_pages(docs, format, page_size, kwargs)
+        markups = format_many(
+            format, self.changed(pages),
+            workers=workers, **kwargs
+        )
+        try:
+            for markup in markups:
+                page, record, slots, missing = self.pending[0]
+                index = missing.popleft()
+                slots[index] = markup
+                self.cache.dump(page.keys[index], markup)
+                self.rendered += 1
+                if not missing:
+                    self.pending.popleft()
+                    self.write(page, record, slots)
+        finally:
+            self.save()
+
+        self.clean()
+        self.clean_cache()
+        self.manifest = {}
+        self.save()
+        write_file(self.path(INDEX), format_index(self.pages))
+
+    def clean(self):
+        names = {_['name'] for _ in self.pages}
+        for name in self.manifest:
+            path = self.path(name)
+            if name not in names and os.path.exists(path):
+                os.remove(path)
+
+    def clean_cache(self):
+        keys = {key for _ in self.pages for key in _['keys']}
+        for entry in os.scandir(self.cache.path):
+            key, _ = os.path.splitext(entry.name)
+            if key not in keys:
+                os.remove(entry.path)
+
+
+#######
+#
+#   MAIN
+#
+######
+
+
+def open_input(path):
+    if path == '-':
+        return sys.stdin
+    return open(path, encoding='utf8')
+
+
+def main(args):
+    parser = ArgumentParser(prog='python -m ipymarkup')
+    parser.add_argument('input', help='jsonl or conllu, - for stdin')
+    parser.add_argument('output', help='dir for html pages')
+    parser.add_argument('--format', choices=FORMATS, default='line')
+    parser.add_argument('--input-format', choices=[JSONL, CONLLU])
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--width', type=int)
+    args = parser.parse_args(args)
+
+    format = FORMATS[args.format]
+    dep = format not in SPAN_FORMATS
+    input_format = args.input_format
+    if not input_format:
+        input_format = CONLLU if args.input.endswith('.conllu') else JSONL
+    if input_format == CONLLU and not dep:
+        parser.error('conllu input needs dep format')
+    if args.page_size < 1:
+        parser.error('page size should be positive: %r' % args.page_size)
+
+    kwargs = {}
+    if args.width:
+        if format not in WIDTH_FORMATS:
+            parser.error('width is not supported by %r' % args.format)
+        kwargs['width'] = args.width
+    if not dep:
+        kwargs['palette'] = PALETTE
+
+    build = Build(args.output)
+    with open_input(args.input) as file:
+        if input_format == CONLLU:
+            docs = read_conllu(file)
+        else:
+            docs = read_jsonl(file, dep)
+        build.run(format, docs, args.page_size, args.workers, kwargs)
+
+    print(
+        'pages: %d, written: %d, skipped: %d, docs rendered: %d' % (
+            len(build.pages), build.written,
+            build.skipped, build.rendered
+        ),
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
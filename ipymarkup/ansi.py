@@ -0,0 +1,95 @@
+
+import os
+
+
+TRUECOLOR = 'truecolor'
+COLORS256 = '256'
+NOCOLOR = 'none'
+
+RESET = '\x1b[0m'
+
+
+def detect_colors(environ=os.environ):
+    # https://no-color.org, https://github.com/termstandard/colors
+    if environ.get('NO_COLOR'):
+        return NOCOLOR
+    if environ.get('COLORTERM') in ('truecolor', '24bit'):
+        return TRUECOLOR
+    return COLORS256
+
+
+def terminal_width(default=70):
+    from shutil import get_terminal_size
+
+    return get_terminal_size((default, 24)).columns
+
+
+#######
+#
+#   RGB
+#
+#####
+
+
+CUBE = [0, 95, 135, 175, 215, 255]
+
+
+def rgb_channels(rgb):
+    value = rgb.value
+    return (
+        int(value[1:3], 16),
+        int(value[3:5], 16),
+        int(value[5:7], 16)
+    )
+
+
+def nearest_cube(channel):
+    return min(range(6), key=lambda _: abs(CUBE[_] - channel))
+
+
+def rgb_256(red, green, blue):
+    # xterm 256: 6x6x6 cube from 16, 24 greys from 232
+    cube = [nearest_cube(_) for _ in (red, green, blue)]
+    r, g, b = cube
+    index = 16 + 36 * r + 6 * g + b
+    distance = sum(
+        (CUBE[a] - b) ** 2
+        for a, b in zip(cube, (red, green, blue))
+    )
+
+    grey = (red + green + blue) // 3
+    step = min(max((grey - 8 + 5) // 10, 0), 23)
+    value = 8 + step * 10
+    if distance > sum((value - _) ** 2 for _ in (red, green, blue)):
+        index = 232 + step
+    return index
+
+
+def rgb_escape(rgb, colors):
+    if rgb is None or colors == NOCOLOR:
+        return ''
+    red, green, blue = rgb_channels(rgb)
+    if colors == TRUECOLOR:
+        return '\x1b[38;2;%d;%d;%dm' % (red, green, blue)
+    elif colors == COLORS256:
+        return '\x1b[38;5;%dm' % rgb_256(red, green, blue)
+    else:
+        raise ValueError('Unexpected colors: %r' % colors)
+
+
+class Escapes(dict):
+    # Rgb -> escape, computed once per render
+    def __init__(self, colors=None):
+        super(Escapes, self).__init__()
+        self.colors = colors or detect_colors()
+
+    def __missing__(self, rgb):
+        value = rgb_escape(rgb, self.colors)
+        self[rgb] = value
+        return value
+
+    def paint(self, text, rgb):
+        escape = self[rgb]
+        if escape and text:
+            return escape + text + RESET
+        return text
@@ -0,0 +1,164 @@
+
+import os
+from itertools import islice
+from collections import deque
+
+from .span import (
+    SpanArray,
+    prepare_spans,
+    order_spans,
+    format_span_box_markup,
+    format_span_line_markup,
+    format_span_ascii_markup,
+    format_span_svg_markup
+)
+from .dep import (
+    DepArray,
+    prepare_deps,
+    format_dep_markup,
+    format_dep_ascii_markup
+)
+from .diff import (
+    format_span_diff_markup,
+    format_span_diff_ascii_markup
+)
+from .palette import PALETTE
+
+
+PALETTE_FORMATS = [
+    format_span_box_markup,
+    format_span_line_markup,
+    format_span_svg_markup
+]
+SPAN_FORMATS = PALETTE_FORMATS + [
+    format_span_ascii_markup
+]
+DIFF_FORMATS = [
+    format_span_diff_markup,
+    format_span_diff_ascii_markup
+]
+ASCII_FORMATS = [
+    format_span_ascii_markup,
+    format_dep_ascii_markup,
+    format_span_diff_ascii_markup
+]
+
+
+def render(format, *args, **kwargs):
+    lines = format(*args, **kwargs)
+    if format in ASCII_FORMATS:
+        return '\n'.join(lines)
+    return ''.join(lines)
+
+
+def render_chunk(format, docs, kwargs):
+    return [
+        render(format, *doc, **kwargs)
+        for doc in docs
+    ]
+
+
+def prepare_span_docs(docs, palette=None):
+    for text, spans in docs:
+        spans = prepare_spans(spans)
+        if not isinstance(spans, SpanArray):
+            spans = list(spans)
+        if palette:
+            # assign colors in parent in docs order, so workers only
+            # read palette and colors do not depend on scheduling.
+            # Formatters get colors in start order
+            for _, _, type in order_spans(spans):
+                palette.get(type)
+        yield text, spans
+
+
+def prepare_dep_docs(docs):
+    for words, deps in docs:
+        deps = prepare_deps(deps)
+        if not isinstance(deps, DepArray):
+            deps = list(deps)
+        yield words, deps
+
+
+def prepare_diff_docs(docs):
+    # diff colors are fixed, no palette to assign
+    for text, gold, pred in docs:
+        yield text, list(prepare_spans(gold)), list(prepare_spans(pred))
+
+
+def chunk_docs(docs, size):
+    docs = iter(docs)
+    while True:
+        chunk = list(islice(docs, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def format_many(format, docs, workers=None, chunk_size=64, **kwargs):
+    palette = None
+    if format in PALETTE_FORMATS:
+        palette = kwargs.pop('palette', PALETTE)
+        docs = prepare_span_docs(docs, palette)
+    elif format in SPAN_FORMATS:
+        docs = prepare_span_docs(docs)
+    elif format in DIFF_FORMATS:
+        docs = prepare_diff_docs(docs)
+    else:
+        docs = prepare_dep_docs(docs)
+    chunks = chunk_docs(docs, chunk_size)
+
+    if not workers:
+        workers = os.cpu_count() or 1
+
+    if workers == 1:  # no pool, render in current process
+        if palette:
+            kwargs['palette'] = palette
+        for chunk in chunks:
+            yield from render_chunk(format, chunk, kwargs)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers) as executor:
+        futures = deque()
+        for chunk in chunks:
+            if palette:
+                # chunk is pickled later in executor thread, palette
+                # may change by then
+                kwargs = dict(kwargs, palette=palette.freeze())
+            future = executor.submit(render_chunk, format, chunk, kwargs)
+            futures.append(future)
+            if len(futures) > 2 * workers:
+                yield from futures.popleft().result()
+
+        while futures:
+            yield from futures.popleft().result()
+
+
+def format_span_box_markup_many(docs, **kwargs):
+    return format_many(format_span_box_markup, docs, **kwargs)
+
+
+def format_span_line_markup_many(docs, **kwargs):
+    return format_many(format_span_line_markup, docs, **kwargs)
+
+
+def format_span_ascii_markup_many(docs, **kwargs):
+    return format_many(format_span_ascii_markup, docs, **kwargs)
+
+
+def format_dep_markup_many(docs, **kwargs):
+    return format_many(format_dep_markup, docs, **kwargs)
+
+
+def format_dep_ascii_markup_many(docs, **kwargs):
+    return format_many(format_dep_ascii_markup, docs, **kwargs)
+
+
+def format_span_diff_markup_many(docs, **kwargs):
+    return format_many(format_span_diff_markup, docs, **kwargs)
+
+
+def format_span_diff_ascii_markup_many(docs, **kwargs):
+    return format_many(format_span_diff_ascii_markup, docs, **kwargs)
@@ -0,0 +1,572 @@
+
+import os
+import sys
+import json
+import random
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+
+from .span import (
+    Span,
+    format_span_box_markup,
+    format_span_line_markup,
+    format_span_ascii_markup,
+    format_span_svg_markup,
+    format_span_ascii_lines,
+    write_span_line_markup,
+    order_spans,
+    get_multilines,
+    wrap_multilines,
+    wrap,
+    OFFSETS,
+    TEXTWRAP
+)
+from .dep import (
+    format_dep_markup,
+    format_dep_ascii_markup,
+    format_dep_svg_markup
+)
+
+
+########
+#
+#   MEASURE
+#
+#######
+
+
+def measure_time(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = timer()
+        function()
+        time = timer() - start
+        if best is None or time < best:
+            best = time
+    return best
+
+
+def measure_memory(function):
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+#######
+#
+#   RECORD
+#
+######
+
+
+class DictRecord(object):
+    # Record before __slots__, kept for comparison
+    __attributes__ = []
+
+    def __eq__(self, other):
+        return (
+            type(self) == type(other)
+            and all(
+                (getattr(self, _) == getattr(other, _))
+                for _ in self.__attributes__
+            )
+        )
+
+    def __iter__(self):
+        return (getattr(self, _) for _ in self.__attributes__)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+
+class DictSpan(DictRecord):
+    __attributes__ = ['start', 'stop', 'type']
+
+    def __init__(self, start, stop, type=None):
+        self.start = start
+        self.stop = stop
+        self.type = type
+
+
+def bench_record(cls, count):
+    def create():
+        return [cls(_, _ + 1, 'PER') for _ in range(count)]
+
+    records = create()
+    copies = create()
+
+    def unpack():
+        for start, stop, type in records:
+            pass
+
+    def compare():
+        for a, b in zip(records, copies):
+            a == b
+
+    def hash_():
+        for record in records:
+            hash(record)
+
+    return {
+        'record': cls.__name__,
+        'count': count,
+        'bytes': measure_memory(create) / count,
+        'create': measure_time(create),
+        'unpack': measure_time(unpack),
+        'eq': measure_time(compare),
+        'hash': measure_time(hash_),
+    }
+
+
+def bench_records(count=100000):
+    for cls in [DictSpan, Span]:
+        yield bench_record(cls, count)
+
+
+#######
+#
+#   TAGS
+#
+#####
+
+
+def flat_span_case(count, types=8):
+    words, spans = [], []
+    start = 0
+    for index in range(count):
+        word = 'word%d' % (index % 10)
+        stop = start + len(word)
+        words.append(word)
+        spans.append(Span(start, stop, 'T%d' % (index % types)))
+        start = stop + 1
+    return ' '.join(words), spans
+
+
+def bench_tags(count=100000):
+    text, spans = flat_span_case(count)
+    for format in [format_span_box_markup, format_span_line_markup]:
+        for stylesheet in [False, True]:
+            def run():
+                for _ in format(text, spans, stylesheet=stylesheet):
+                    pass
+
+            yield {
+                'format': format.__name__,
+                'stylesheet': stylesheet,
+                'spans': count,
+                'time': measure_time(run)
+            }
+
+
+#######
+#
+#   WRAP
+#
+#####
+
+
+WRAP_TOKENS = [
+    'a', 'word', 'longerword', 'averyveryverylongword',
+    'x-y', 'well-known', '12-34', '-', '--', 'a--b', '-a-',
+    '.', ',', '!', '(', ')', "'", '"', 'é', '—',
+    ' ', ' ', ' ', '  ', '\t', '\n', '\r\n', '\n\n'
+]
+
+
+def wrap_corpus(count, seed=1):
+    generator = random.Random(seed)
+    for _ in range(count):
+        size = generator.randrange(0, 200)
+        yield ''.join(
+            generator.choice(WRAP_TOKENS)
+            for _ in range(size)
+        )
+
+
+def bench_wrap(count=2000, widths=(1, 3, 10, 40, 80)):
+    # offsets engine must give same lines as TextWrapper
+    texts = list(wrap_corpus(count))
+    results = {}
+    for mode in [TEXTWRAP, OFFSETS]:
+        def run():
+            return [
+                list(wrap(text, width, mode))
+                for width in widths
+                for text in texts
+            ]
+
+        results[mode] = run()
+        yield {
+            'mode': mode,
+            'texts': count,
+            'time': measure_time(run)
+        }
+
+    if results[TEXTWRAP] != results[OFFSETS]:
+        raise AssertionError('offsets wrap differs from textwrap')
+
+
+#######
+#
+#   ASCII
+#
+#####
+
+
+def nested_span_case(count, depth, size=1):
+    # groups of depth words, spans nested inside every group
+    words, spans = [], []
+    start = 0
+    for index in range(count):
+        word = 'word%d' % (index % 10) * size
+        words.append(word)
+        if index % depth == 0:
+            group = start
+        stop = start + len(word)
+        spans.append(Span(group, stop, 'T%d' % (index % depth)))
+        start = stop + 1
+    return ' '.join(words), spans
+
+
+def legacy_span_ascii_lines(text, multilines, width):
+    # per char matrix fill, kept for comparison
+    for offset, line, multilines in wrap_multilines(text, multilines, width):
+        yield line.replace('\t', ' ')
+
+        if multilines:
+            height = max(
+                line.level
+                for multi in multilines
+                for line in multi.lines
+            ) + 1
+            width = len(line)
+            matrix = [
+                [' ' for _ in range(width)]
+                for row in range(height)
+            ]
+            for multi in multilines:
+                for line in multi.lines:
+                    for x in range(multi.start, multi.stop):
+                        matrix[line.level][x] = '─'
+            for multi in multilines:
+                for line in multi.lines:
+                    if line.type and offset + multi.start == line.start:
+                        size = line.stop - line.start
+                        space = width - multi.start
+                        type = line.type[:min(size, space)]
+                        for x, char in enumerate(type):
+                            x = multi.start + x
+                            matrix[line.level][x] = char
+            for row in matrix:
+                yield ''.join(row)
+
+
+def bench_ascii(count=5000, depths=(1, 4, 16), sizes=(1, 8), width=200):
+    for depth in depths:
+        for size in sizes:
+            text, spans = nested_span_case(count, depth, size)
+            multilines = list(get_multilines(order_spans(spans)))
+            lines = list(format_span_ascii_lines(text, multilines, width))
+            if lines != list(legacy_span_ascii_lines(text, multilines, width)):
+                raise AssertionError('ascii lines differ from legacy')
+
+            for format in [legacy_span_ascii_lines, format_span_ascii_lines]:
+                def run():
+                    for _ in format(text, multilines, width):
+                        pass
+
+                yield {
+                    'format': format.__name__,
+                    'depth': depth,
+                    'size': size,
+                    'spans': count,
+                    'time': measure_time(run)
+                }
+
+
+#######
+#
+#   FORMATS
+#
+#####
+
+
+def random_words(generator, count):
+    return [
+        'w' * generator.randint(1, 8)
+        for _ in range(count)
+    ]
+
+
+def random_span_case(count, depth=3, density=0.5, seed=1):
+    # density is share of words that start span group, group is
+    # 1-4 words with up to depth nested spans
+    generator = random.Random(seed)
+    words = random_words(generator, count)
+    starts, stops = [], []
+    offset = 0
+    for word in words:
+        starts.append(offset)
+        offset += len(word)
+        stops.append(offset)
+        offset += 1
+
+    spans = []
+    index = 0
+    while index < count:
+        if generator.random() >= density:
+            index += 1
+            continue
+        size = min(generator.randint(1, 4), count - index)
+        start, stop = index, index + size
+        for _ in range(generator.randint(1, depth)):
+            spans.append(Span(
+                starts[start], stops[stop - 1],
+                'T%d' % generator.randrange(8)
+            ))
+            start = generator.randrange(start, stop)
+            stop = generator.randrange(start, stop) + 1
+        index += size
+    return ' '.join(words), spans
+
+
+def random_projective_tree(count, max_arc=5, seed=1):
+    # arc standard with random reduces, reduce is forced when second
+    # on stack is further than max_arc from current word
+    generator = random.Random(seed)
+    deps, stack = [], []
+    for index in range(count):
+        stack.append(index)
+        while len(stack) > 1 and (
+                index - stack[-2] >= max_arc
+                or generator.random() < 0.5):
+            top = stack.pop()
+            second = stack.pop()
+            if generator.random() < 0.5:
+                deps.append((top, second, 'rel'))
+                stack.append(top)
+            else:
+                deps.append((second, top, 'rel'))
+                stack.append(second)
+    while len(stack) > 1:
+        dependent = stack.pop()
+        deps.append((stack[-1], dependent, 'rel'))
+    return random_words(generator, count), deps
+
+
+def random_tree(count, max_arc=5, seed=1):
+    # non projective, words attach in random order to any attached
+    # word not further than max_arc
+    generator = random.Random(seed)
+    order = list(range(count))
+    generator.shuffle(order)
+    attached = set(order[:1])
+    deps = []
+    for index in order[1:]:
+        heads = [
+            _ for _ in range(index - max_arc, index + max_arc + 1)
+            if _ in attached
+        ]
+        if not heads:
+            heads = [min(attached, key=lambda _: abs(_ - index))]
+        deps.append((generator.choice(heads), index, 'rel'))
+        attached.add(index)
+    return random_words(generator, count), deps
+
+
+SPAN_BENCH_FORMATS = [
+    format_span_box_markup,
+    format_span_line_markup,
+    format_span_ascii_markup,
+    format_span_svg_markup,
+]
+DEP_BENCH_FORMATS = [
+    format_dep_markup,
+    format_dep_ascii_markup,
+    format_dep_svg_markup,
+]
+
+
+def bench_format(format, data, items):
+    def run():
+        return ''.join(format(data, items))
+
+    time = measure_time(run)
+    return {
+        'format': format.__name__,
+        'items': len(items),
+        'time': time,
+        'throughput': len(items) / time if time else None,
+        'memory': measure_memory(run),
+        'bytes': len(run().encode('utf8')),
+    }
+
+
+def bench_formats(sizes=(100, 1000, 10000)):
+    for size in sizes:
+        for depth in [1, 3]:
+            text, spans = random_span_case(size, depth)
+            for format in SPAN_BENCH_FORMATS:
+                result = bench_format(format, text, spans)
+                yield dict(result, case='spans', words=size, depth=depth)
+
+        for name, generate in [
+                ('projective', random_projective_tree),
+                ('tree', random_tree)]:
+            words, deps = generate(size)
+            for format in DEP_BENCH_FORMATS:
+                result = bench_format(format, words, deps)
+                yield dict(result, case=name, words=size)
+
+
+#######
+#
+#   IMPORT
+#
+#####
+
+
+IMPORT_CASES = {
+    'package': 'import ipymarkup',
+    'span': 'import ipymarkup; ipymarkup.format_span_line_markup',
+    'dep': 'import ipymarkup; ipymarkup.format_dep_markup',
+    'batch': 'import ipymarkup; ipymarkup.format_span_line_markup_many',
+}
+
+IMPORT_SCRIPT = '''
+import sys
+from timeit import default_timer as timer
+modules = len(sys.modules)
+start = timer()
+%s
+print(timer() - start, len(sys.modules) - modules)
+'''
+
+
+def import_top(code):
+    # python -X importtime, modules with largest self time
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True
+    ).stderr
+    items = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self, _, name = line[len('import time:'):].split('|')
+        if self.strip().isdigit():
+            items.append((int(self), name.strip()))
+    return sorted(items, reverse=True)
+
+
+def bench_import(repeat=5, top=5):
+    # every run is fresh interpreter, time is best of repeat
+    for name, code in IMPORT_CASES.items():
+        best = None
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, '-c', IMPORT_SCRIPT % code],
+                capture_output=True, text=True, check=True
+            ).stdout
+            time, modules = output.split()
+            time = float(time)
+            if best is None or time < best:
+                best = time
+        yield {
+            'case': name,
+            'time': best,
+            'modules': int(modules),
+            'top': import_top(code)[:top]
+        }
+
+
+#######
+#
+#   WRITE
+#
+#####
+
+
+def bench_write(count=50000, sizes=(2 ** 12, 2 ** 16)):
+    # join whole markup then write vs buffered write
+    text, spans = random_span_case(count)
+    with open(os.devnull, 'w') as file:
+        def join():
+            file.write(''.join(format_span_line_markup(text, spans)))
+
+        yield {
+            'mode': 'join',
+            'spans': len(spans),
+            'time': measure_time(join),
+            'memory': measure_memory(join)
+        }
+
+        for size in sizes:
+            def write():
+                write_span_line_markup(text, spans, file, size)
+
+            yield {
+                'mode': 'write',
+                'size': size,
+                'spans': len(spans),
+                'time': measure_time(write),
+                'memory': measure_memory(write)
+            }
+
+
+#######
+#
+#   MAIN
+#
+#####
+
+
+BENCHES = {
+    'records': bench_records,
+    'tags': bench_tags,
+    'wrap': bench_wrap,
+    'ascii': bench_ascii,
+    'formats': bench_formats,
+    'import': bench_import,
+    'write': bench_write,
+}
+
+
+def main(args):
+    parser = ArgumentParser(prog='python -m ipymarkup.bench')
+    parser.add_argument('names', nargs='*', help=', '.join(BENCHES))
+    parser.add_argument('--output', help='save results as json')
+    args = parser.parse_args(args)
+    for name in args.names:
+        if name not in BENCHES:
+            parser.error('unknown bench: %r' % name)
+
+    results = []
+    for name in args.names or list(BENCHES):
+        for result in BENCHES[name]():
+            result = dict(result, bench=name)
+            print(json.dumps(result))
+            results.append(result)
+
+    if args.output:
+        data = {
+            'date': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results
+        }
+        with open(args.output, 'w') as file:
+            json.dump(data, file, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,162 @@
+
+import os
+from hashlib import sha1
+from threading import Lock
+from collections import OrderedDict
+
+from .span import (
+    prepare_spans,
+    order_spans
+)
+from .dep import prepare_deps
+from .palette import PALETTE
+from .batch import (
+    render,
+    PALETTE_FORMATS,
+    SPAN_FORMATS
+)
+
+
+########
+#
+#   KEY
+#
+#######
+
+
+def color_key(color):
+    return (color.name,) + tuple(
+        rgb.value if rgb else None
+        for rgb in [color.background, color.border, color.text, color.line]
+    )
+
+
+def prepare_markup(format, items, kwargs):
+    if format in SPAN_FORMATS:
+        items = [tuple(_) for _ in order_spans(prepare_spans(items))]
+    else:
+        items = [tuple(_) for _ in prepare_deps(items)]
+
+    colors = None
+    if format in PALETTE_FORMATS:
+        palette = kwargs.get('palette', PALETTE)
+        colors = {}
+        for _, _, type in items:
+            if type not in colors:
+                colors[type] = color_key(palette.get(type))
+        colors = sorted(colors.items(), key=repr)
+    return items, colors
+
+
+def bind_kwargs(format, kwargs):
+    # width=80 and no width give same markup, so same key
+    from inspect import signature
+
+    arguments = signature(format).bind_partial(**kwargs)
+    arguments.apply_defaults()
+    return arguments.arguments
+
+
+def render_key(format, data, items, colors, kwargs):
+    kwargs = sorted(
+        (key, value) for key, value in bind_kwargs(format, kwargs).items()
+        if key != 'palette'
+    )
+    parts = [
+        format.__module__, format.__name__,
+        data, items, colors, kwargs
+    ]
+    hash = sha1()
+    for part in parts:
+        hash.update(repr(part).encode('utf8'))
+    return hash.hexdigest()
+
+
+#######
+#
+#   CACHE
+#
+######
+
+
+class RenderCache(object):
+    # LRU of rendered markup keyed by content hash of text or words,
+    # spans or deps, palette colors and format options. With path
+    # markup is also stored on disk, one file per key, and survives
+    # restarts, disk is not bounded by size
+
+    def __init__(self, size=128, path=None):
+        self.size = size
+        self.path = path
+        self.items = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items or (
+            self.path is not None
+            and os.path.exists(self.file(key))
+        )
+
+    def file(self, key):
+        return os.path.join(self.path, key + '.html')
+
+    def load(self, key):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+
+        if self.path:
+            try:
+                with open(self.file(key), encoding='utf8') as file:
+                    value = file.read()
+            except FileNotFoundError:
+                return
+            self.store(key, value)
+            return value
+
+    def store(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def dump(self, key, value):
+        path = self.file(key)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'w', encoding='utf8') as file:
+            file.write(value)
+        os.replace(tmp, path)
+
+    def render(self, format, data, items, **kwargs):
+        items, colors = prepare_markup(format, items, kwargs)
+        key = render_key(format, data, items, colors, kwargs)
+
+        value = self.load(key)
+        with self.lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is not None:
+            return value
+
+        value = render(format, data, items, **kwargs)
+        self.store(key, value)
+        if self.path:
+            self.dump(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,17 @@
+
+# Rules are scoped by root class derived from rules content, so several
+# renders with different palettes and options live on one page
+
+
+def css_scope(rules):
+    from hashlib import sha1
+
+    data = repr(rules).encode('utf8')
+    return 'ipymarkup-' + sha1(data).hexdigest()[:8]
+
+
+def format_css(scope, rules):
+    yield '<style>'
+    for name, style in rules:
+        yield '.%s .%s {%s}' % (scope, name, style)
+    yield '</style>'
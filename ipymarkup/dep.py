@@ -1,12 +1,15 @@
 
 from html import escape
-from collections import defaultdict
+from bisect import insort, bisect_left
+from heapq import heappush, heappop
+from itertools import repeat
 
-from intervaltree import IntervalTree as Intervals
-
-from .show import show_html
+from .show import show_html, show_html_pages, show_ansi, write_lines
 from .record import Record
-from .palette import GREY
+from .palette import GREY, PALETTE
+from .css import css_scope, format_css
+from .ansi import Escapes
+from .stats import profiled, timed, lazy, count
 
 
 ########
@@ -21,6 +24,7 @@ ROOT = 'root'
 
 class Dep(Record):
     __attributes__ = ['source', 'target', 'type']
+    __slots__ = ['source', 'target', 'type']
 
     def __init__(self, source, target, type):
         if source == target:
@@ -52,12 +56,14 @@ def prepare_dep(dep):
 
 
 def prepare_deps(deps):
-    for dep in deps:
-        yield prepare_dep(dep)
+    if isinstance(deps, DepArray):
+        return deps  # validated on init
+    return (prepare_dep(_) for _ in deps)
 
 
 class DepMarkup(Record):
     __attributes__ = ['words', 'deps']
+    __slots__ = ['words', 'deps']
 
     def __init__(self, words, deps):
         self.words = words
@@ -81,6 +87,7 @@ INSIDE = 'inside'
 
 class Arc(Record):
     __attributes__ = ['start', 'stop', 'direction', 'type', 'level']
+    __slots__ = ['start', 'stop', 'direction', 'type', 'level']
 
     def __init__(self, start, stop, direction, type, level):
         self.start = start
@@ -98,6 +105,7 @@ class Arc(Record):
 
 class ArcSection(Record):
     __attributes__ = ['part', 'direction', 'type', 'level', 'parent']
+    __slots__ = ['part', 'direction', 'type', 'level', 'parent']
 
     def __init__(self, part, direction, type, level, parent):
         self.part = part
@@ -117,6 +125,7 @@ class ArcSection(Record):
 
 class DepMarkupSection(Record):
     __attributes__ = ['word', 'arcs']
+    __slots__ = ['word', 'arcs']
 
     def __init__(self, word, arcs):
         self.word = word
@@ -130,25 +139,68 @@ class DepMarkupSection(Record):
 #####
 
 
-def get_free_level(intervals):
-    levels = [
-        _.data.level for _ in intervals
-        if _.data.level is not None
-    ]
-    if not levels:
+class Levels(object):
+    # Segment tree over word indexes, for every node keeps max and min
+    # level of arcs added inside node (high, low) and of arcs that
+    # cover node completely (high_cover, low_cover)
+
+    def __init__(self, size):
+        self.size = max(size, 1)
+        nodes = 4 * self.size
+        self.high = [-1] * nodes
+        self.low = [float('inf')] * nodes
+        self.high_cover = [-1] * nodes
+        self.low_cover = [float('inf')] * nodes
+
+    def add(self, start, stop, level, node=1, left=0, right=None):
+        if right is None:
+            right = self.size
+        self.high[node] = max(self.high[node], level)
+        self.low[node] = min(self.low[node], level)
+        if start <= left and right <= stop:
+            self.high_cover[node] = max(self.high_cover[node], level)
+            self.low_cover[node] = min(self.low_cover[node], level)
+            return
+
+        middle = (left + right) // 2
+        if start < middle:
+            self.add(start, stop, level, 2 * node, left, middle)
+        if stop > middle:
+            self.add(start, stop, level, 2 * node + 1, middle, right)
+
+    def get(self, start, stop, node=1, left=0, right=None):
+        if right is None:
+            if start >= stop:
+                return -1, float('inf')
+            right = self.size
+        if start <= left and right <= stop:
+            return self.high[node], self.low[node]
+
+        high, low = self.high_cover[node], self.low_cover[node]
+        middle = (left + right) // 2
+        if start < middle:
+            child_high, child_low = self.get(start, stop, 2 * node, left, middle)
+            high, low = max(high, child_high), min(low, child_low)
+        if stop > middle:
+            child_high, child_low = self.get(start, stop, 2 * node + 1, middle, right)
+            high, low = max(high, child_high), min(low, child_low)
+        return high, low
+
+
+def get_free_level(high, low):
+    if high < 0:
         return 0
-    if min(levels) > 0:
+    if low > 0:
         return 0
-    return max(levels) + 1
+    return high + 1
 
 
 ASCII = 'ascii'
 HTML = 'html'
 
 
-def section_markup(markup, mode=HTML):
-    arcs = []
-    for source, target, type in markup.deps:
+def markup_arcs(deps):
+    for source, target, type in deps:
         if type == ROOT:
             continue
 
@@ -159,44 +211,171 @@ def section_markup(markup, mode=HTML):
             start, stop = target, source
             direction = LEFT
 
-        arc = Arc(start, stop, direction, type, level=None)
-        arcs.append(arc)
+        yield Arc(start, stop, direction, type, level=None)
 
-    # order
-    arcs = sorted(arcs, key=Arc.layout_order)
 
-    # level
-    intervals = Intervals()
-    for arc in arcs:
-        stop = arc.stop
-        if mode == ASCII:
-            stop += 1  # in ascii mode include stop
-        intervals.addi(arc.start, stop, arc)
+def arc_levels(arcs, mode=HTML):
+    # arcs are (start, stop, direction, type, ...) in layout order
+    if not arcs:
+        return
 
+    # in ascii mode include stop
+    extra = 1 if mode == ASCII else 0
+    size = max(max(start, stop) for start, stop, *_ in arcs) + 1 + extra
+    levels = Levels(size)
+    seen = set()
     for arc in arcs:
-        selected = intervals.overlap(arc.start, arc.stop)
-        arc.level = get_free_level(selected)
+        key = tuple(arc)[:4]
+        start, stop, _, _ = key
+        start, stop = max(start, 0), max(stop, 0)
+        high, low = levels.get(start, stop)
+        level = get_free_level(high, low)
+        yield level
 
-    # group
-    sections = defaultdict(list)
-    for arc in arcs:
-        start, stop, direction, type, level = arc
-        parent = id(arc)
-        for index in range(start, stop + 1):
-            if index == start:
-                part = BEGIN if direction == RIGHT else END
-            elif index == stop:
-                part = END if direction == RIGHT else BEGIN
-            else:
-                part = INSIDE
+        # equal arcs block level only once
+        if key not in seen:
+            seen.add(key)
+            levels.add(start, stop + extra, level)
+
+
+def layout_arcs(arcs, mode=HTML):
+    arcs = sorted(arcs, key=Arc.layout_order)
+    for arc, level in zip(arcs, arc_levels(arcs, mode)):
+        arc.level = level
+    return arcs
+
+
+#######
+#
+#   ARRAY
+#
+#####
 
-            section = ArcSection(part, direction, type, level, parent)
-            sections[index].append(section)
 
-    for index, word in enumerate(markup.words):
-        arcs = sections[index]
-        arcs = sorted(arcs, key=Arc.level_order)
-        yield DepMarkupSection(word, arcs)
+class DepArray(object):
+    # Columnar CoNLL-U style deps: heads[i] is 1-based index of word i
+    # head, 0 for root, rels[i] is relation. Iterates (source, target,
+    # type) tuples, no Dep objects are created
+
+    def __init__(self, heads, rels=None):
+        import numpy as np
+
+        heads = np.asarray(heads, dtype=np.int64)
+        if heads.ndim != 1:
+            raise ValueError('bad shape: %r' % (heads.shape,))
+
+        size = len(heads)
+        bad = np.flatnonzero((heads < 0) | (heads > size))
+        if len(bad):
+            raise ValueError('bad head: %r' % int(heads[bad[0]]))
+
+        loops = np.flatnonzero(heads == np.arange(1, size + 1))
+        if len(loops):
+            raise ValueError('loop dep: %r' % int(loops[0]))
+
+        if rels is not None:
+            rels = np.asarray(rels, dtype=object)
+            if rels.shape != heads.shape:
+                raise ValueError('bad shape: %r' % (rels.shape,))
+
+        self.heads = heads
+        self.rels = rels
+
+    def __len__(self):
+        return len(self.heads)
+
+    def __iter__(self):
+        heads = self.heads.tolist()
+        rels = repeat(None) if self.rels is None else self.rels.tolist()
+        for target, (head, rel) in enumerate(zip(heads, rels)):
+            if head > 0:
+                yield head - 1, target, rel
+
+    def arcs(self, mode=HTML):
+        import numpy as np
+
+        targets = np.arange(len(self.heads))
+        selected = self.heads > 0
+        if self.rels is not None:
+            selected &= self.rels != ROOT
+        sources = self.heads[selected] - 1
+        targets = targets[selected]
+
+        starts = np.minimum(sources, targets)
+        stops = np.maximum(sources, targets)
+        directions = np.where(sources < targets, RIGHT, LEFT)
+        if self.rels is None:
+            types = repeat(None)
+        else:
+            types = self.rels[selected]
+
+        order = np.lexsort((starts, stops - starts))  # stable
+        arcs = list(zip(
+            starts[order].tolist(),
+            stops[order].tolist(),
+            directions[order].tolist(),
+            types if self.rels is None else types[order].tolist(),
+        ))
+        levels = arc_levels(arcs, mode)
+        return [
+            (start, stop, direction, type, level)
+            for (start, stop, direction, type), level
+            in zip(arcs, levels)
+        ]
+
+
+def prepare_arcs(deps, mode=HTML):
+    deps = prepare_deps(deps)
+    if isinstance(deps, DepArray):
+        return deps.arcs(mode)
+    return layout_arcs(markup_arcs(deps), mode)
+
+
+def max_arc_level(arcs):
+    return max((level for *_, level in arcs), default=-1)
+
+
+def arc_part(start, stop, direction, index):
+    if index == start:
+        return BEGIN if direction == RIGHT else END
+    elif index == stop:
+        return END if direction == RIGHT else BEGIN
+    return INSIDE
+
+
+def sweep_sections(words, arcs):
+    # arcs are Arc or tuples in layout order, keep ones that cover
+    # current word sorted by level desc and layout order
+    starts = [start for start, *_ in arcs]
+    order = sorted(range(len(arcs)), key=starts.__getitem__)
+    active, stops = [], []
+    pointer = 0
+    for index, word in enumerate(words):
+        while pointer < len(order) and starts[order[pointer]] <= index:
+            rank = order[pointer]
+            _, stop, _, _, level = arcs[rank]
+            if stop >= index:
+                insort(active, (-level, rank))
+                heappush(stops, (stop, -level, rank))
+            pointer += 1
+
+        sections = []
+        for _, rank in active:
+            arc = arcs[rank]
+            start, stop, direction, type, level = arc
+            part = arc_part(start, stop, direction, index)
+            section = ArcSection(part, direction, type, level, id(arc))
+            sections.append(section)
+        yield DepMarkupSection(word, sections)
+
+        while stops and stops[0][0] <= index:
+            _, level, rank = heappop(stops)
+            del active[bisect_left(active, (level, rank))]
+
+
+def section_markup(markup, mode=HTML):
+    arcs = prepare_arcs(markup.deps, mode)
+    return sweep_sections(markup.words, arcs)
 
 
 ########
@@ -216,14 +395,13 @@ def space_section_arcs(previous):
 
 
 def add_space_sections(sections):
-    size = len(sections)
-    for index in range(size):
-        section = sections[index]
-        if index > 0:
-            previous = sections[index - 1]
+    previous = None
+    for section in sections:
+        if previous is not None:
             arcs = list(space_section_arcs(previous))
             yield DepMarkupSection(word=None, arcs=arcs)
         yield section
+        previous = section
 
 
 ########
@@ -233,16 +411,131 @@ def add_space_sections(sections):
 #####
 
 
-def format_dep_markup(words, deps,
-                      arc_radius=5, arc_skew=5, arc_gap=10):
-    deps = list(prepare_deps(deps))
-    markup = DepMarkup(words, deps)
-    sections = list(section_markup(markup))
-    sections = list(add_space_sections(sections))
+def box_style(arc_radius, height):
+    return [
+        'display: block', 'position: relative',
+        'min-width: %dpx' % arc_radius, 'height: %dpx' % height
+    ]
+
+
+def border_style(color, level, arc_gap):
+    return [
+        'display: block', 'position: absolute', 'bottom: 0',
+        'border-top: 1px solid %s' % color.line.value,
+        'height: %dpx' % (arc_gap * (level + 1))
+    ]
+
 
-    yield '<div class="tex2jax_ignore">'
+def shape_style(color, shape, arc_radius, arc_skew):
+    if shape == RIGHT:
+        #   ___
+        #  /
+        return [
+            'right: 0', 'border-top-left-radius: %dpx' % arc_radius,
+            'border-left: 1px solid %s' % color.line.value,
+            'transform: skew(%ddeg)' % -arc_skew,
+        ]
+    elif shape == LEFT:
+        #  __
+        #    \
+        return [
+            'left: 0', 'border-top-right-radius: %dpx' % arc_radius,
+            'border-right: 1px solid %s' % color.line.value,
+            'transform: skew(%ddeg)' % arc_skew,
+        ]
+
+
+def arrow_style(color, direction):
+    # css triangle trick https://css-tricks.com/snippets/css/css-triangle/
+    width, height = 3, 6
+    style = [
+        'display: block', 'position: absolute',
+        'bottom: -1px',  # cover border a bit
+        'width: 0', 'height: 0',
+        'border-left: %dpx solid transparent' % width,
+        'border-right: %dpx solid transparent' % width,
+        'border-top: %dpx solid %s' % (height, color.line.value)
+    ]
+    if direction == LEFT:
+        style.append('left: %dpx' % -width)
+    elif direction == RIGHT:
+        style.append('right: %dpx' % -width)
+    return style
+
+
+def label_style(color, direction, arc_skew, arc_gap):
+    style = [
+        'display: block', 'position: absolute',
+        'top: %dpx' % -arc_gap,
+        'line-height: 1',
+        'font-size: %dpx' % (arc_gap * 0.9),  # to fit between lines
+        'color: %s' % color.text.value
+    ]
+    if direction == LEFT:
+        style.append('transform: skew(%ddeg)' % arc_skew)  # recover
+    elif direction == RIGHT:
+        style.append('transform: skew(%ddeg)' % -arc_skew)
+    return style
+
+
+def dep_rules(height, arc_radius, arc_skew, arc_gap):
+    color = GREY
+    rules = [
+        ('s', ['display: inline-block']),
+        ('w', ['display: block']),
+        ('e', box_style(arc_radius, 0)),
+        ('i', ['width: 100%']),
+        ('br', shape_style(color, RIGHT, arc_radius, arc_skew)),
+        ('bl', shape_style(color, LEFT, arc_radius, arc_skew)),
+        ('ar', arrow_style(color, RIGHT)),
+        ('al', arrow_style(color, LEFT)),
+        ('tr', label_style(color, RIGHT, arc_skew, arc_gap)),
+        ('tl', label_style(color, LEFT, arc_skew, arc_gap)),
+    ]
+    for level in range(height):
+        rules.extend([
+            ('h%d' % level, box_style(arc_radius, arc_gap * (level + 2))),
+            ('r%d' % level, border_style(color, level, arc_gap)),
+        ])
+    return [
+        (name, '; '.join(style))
+        for name, style in rules
+    ]
+
+
+SHAPE_CLASSES = {
+    RIGHT: 'br',
+    LEFT: 'bl'
+}
+DIRECTION_CLASSES = {
+    RIGHT: 'r',
+    LEFT: 'l'
+}
+
+
+@profiled
+def format_dep_markup(words, deps,
+                      arc_radius=5, arc_skew=5, arc_gap=10,
+                      stylesheet=False):
+    arcs = timed('prepare_arcs', prepare_arcs, deps)
+    count('arcs', len, arcs)
+    count('max_level', max_arc_level, arcs)
+    sections = lazy('sweep_sections', sweep_sections(words, arcs), 'sections')
+    sections = add_space_sections(sections)
+
+    scope = None
+    if stylesheet:
+        height = max_arc_level(arcs) + 1
+        rules = dep_rules(height, arc_radius, arc_skew, arc_gap)
+        scope = css_scope(rules)
+        yield from format_css(scope, rules)
+
+    yield '<div class="%s">' % ' '.join(filter(None, ['tex2jax_ignore', scope]))
     for section in sections:
-        yield '<span style="display: inline-block">'
+        if stylesheet:
+            yield '<span class="s">'
+        else:
+            yield '<span style="display: inline-block">'
 
         levels = []
         lefts, rights = 0, 0
@@ -253,14 +546,16 @@ def format_dep_markup(words, deps,
             elif arc.shape == RIGHT:
                 rights += 1
 
-        height = 0
-        if levels:
-            height = arc_gap * (max(levels) + 2)  # extra gap for type text
-
-        yield (
-            '<span style="display: block; position: relative; '
-            'min-width: %dpx; height: %dpx">' % (arc_radius, height)
-        )
+        if stylesheet:
+            if levels:
+                yield '<span class="h%d">' % max(levels)
+            else:
+                yield '<span class="e">'
+        else:
+            height = 0
+            if levels:
+                height = arc_gap * (max(levels) + 2)  # extra gap for type text
+            yield '<span style="%s">' % '; '.join(box_style(arc_radius, height))
 
         gap = 100 / (lefts + rights + 1)
         left, right = 0, 0
@@ -271,34 +566,29 @@ def format_dep_markup(words, deps,
             ######
 
             color = GREY
-            style = [
-                'display: block', 'position: absolute', 'bottom: 0',
-                'border-top: 1px solid %s' % color.line.value,
-                'height: %dpx' % (arc_gap * (arc.level + 1))
-            ]
-            if arc.part == INSIDE:
-                style.append('width: 100%')
-            elif arc.shape == RIGHT:
-                #   ___
-                #  /
-                style.extend([
-                    'right: 0', 'border-top-left-radius: %dpx' % arc_radius,
-                    'border-left: 1px solid %s' % color.line.value,
-                    'transform: skew(%ddeg)' % -arc_skew,
-                    'width: %d%%' % ((rights - right) * gap),
-                ])
+            width = None
+            if arc.shape == RIGHT:
+                width = (rights - right) * gap
                 right += 1
-            elif arc.shape in LEFT:
-                #  __
-                #    \
-                style.extend([
-                    'left: 0', 'border-top-right-radius: %dpx' % arc_radius,
-                    'border-right: 1px solid %s' % color.line.value,
-                    'transform: skew(%ddeg)' % arc_skew,
-                    'width: %d%%' % ((lefts - left) * gap)
-                ])
+            elif arc.shape == LEFT:
+                width = (lefts - left) * gap
                 left += 1
-            yield '<span style="%s">' % '; '.join(style)
+
+            if stylesheet:
+                if arc.part == INSIDE:
+                    yield '<span class="r%d i">' % arc.level
+                else:
+                    yield '<span class="r%d %s" style="width: %d%%">' % (
+                        arc.level, SHAPE_CLASSES[arc.shape], width
+                    )
+            else:
+                style = border_style(color, arc.level, arc_gap)
+                if arc.part == INSIDE:
+                    style.append('width: 100%')
+                else:
+                    style.extend(shape_style(color, arc.shape, arc_radius, arc_skew))
+                    style.append('width: %d%%' % width)
+                yield '<span style="%s">' % '; '.join(style)
 
             if arc.part == END:
 
@@ -306,39 +596,22 @@ def format_dep_markup(words, deps,
                 #  ARROW
                 #######
 
-                # css triangle trick https://css-tricks.com/snippets/css/css-triangle/
-                width, height = 3, 6
-                style = [
-                    'display: block', 'position: absolute',
-                    'bottom: -1px',  # cover border a bit
-                    'width: 0', 'height: 0',
-                    'border-left: %dpx solid transparent' % width,
-                    'border-right: %dpx solid transparent' % width,
-                    'border-top: %dpx solid %s' % (height, color.line.value)
-                ]
-                if arc.direction == LEFT:
-                    style.append('left: %dpx' % -width)
-                elif arc.direction == RIGHT:
-                    style.append('right: %dpx' % -width)
-                yield '<span style="%s"></span>' % ('; '.join(style))
+                if stylesheet:
+                    yield '<span class="a%s"></span>' % DIRECTION_CLASSES[arc.direction]
+                else:
+                    style = arrow_style(color, arc.direction)
+                    yield '<span style="%s"></span>' % ('; '.join(style))
 
                 #######
                 #   LABEL
                 ########
 
                 if arc.type:
-                    style = [
-                        'display: block', 'position: absolute',
-                        'top: %dpx' % -arc_gap,
-                        'line-height: 1',
-                        'font-size: %dpx' % (arc_gap * 0.9),  # to fit between lines
-                        'color: %s' % color.text.value
-                    ]
-                    if arc.direction == LEFT:
-                        style.append('transform: skew(%ddeg)' % arc_skew)  # recover
-                    elif arc.direction == RIGHT:
-                        style.append('transform: skew(%ddeg)' % -arc_skew)
-                    yield '<span style="%s">' % '; '.join(style)
+                    if stylesheet:
+                        yield '<span class="t%s">' % DIRECTION_CLASSES[arc.direction]
+                    else:
+                        style = label_style(color, arc.direction, arc_skew, arc_gap)
+                        yield '<span style="%s">' % '; '.join(style)
                     yield escape(arc.type)
                     yield '</span>'
 
@@ -349,7 +622,10 @@ def format_dep_markup(words, deps,
         #  WORD
         #####
 
-        yield '<span style="display: block">'
+        if stylesheet:
+            yield '<span class="w">'
+        else:
+            yield '<span style="display: block">'
         if section.word:
             yield escape(section.word)
         else:  # space section
@@ -368,10 +644,12 @@ def format_dep_markup(words, deps,
 ####
 
 
-def format_dep_ascii_markup(words, deps):
-    deps = list(prepare_deps(deps))
-    markup = DepMarkup(words, deps)
-    sections = list(section_markup(markup, mode=ASCII))
+def dep_ascii_rows(words, deps):
+    # row chars and for every char type of arc it belongs to
+    arcs = timed('prepare_arcs', prepare_arcs, deps, ASCII)
+    sections = timed('sweep_sections', list, sweep_sections(words, arcs))
+    count('arcs', len, arcs)
+    count('sections', len, sections)
 
     max_level = max(
         arc.level
@@ -380,9 +658,10 @@ def format_dep_ascii_markup(words, deps):
     )
     width = (max_level + 1) * 2
 
-    blocks, words, types = [], [], []
+    blocks, owners, words, types = [], [], [], []
     for section in sections:
         row = [' '] * width
+        owner = [None] * width
         type = None
         for arc in section.arcs:
             index = 2 * arc.level
@@ -396,13 +675,16 @@ def format_dep_ascii_markup(words, deps):
                     block = '►'
                     type = arc.type
                 row[index] = block
+                owner[index] = arc.type
 
                 if arc.shape == LEFT:
                     block = '└'
                 elif arc.shape == RIGHT:
                     block = '┌'
                 row[index + 1] = block
+            owner[index + 1] = arc.type
         blocks.append(list(reversed(row)))
+        owners.append(list(reversed(owner)))
         words.append(section.word)
         types.append(type)
 
@@ -418,14 +700,232 @@ def format_dep_ascii_markup(words, deps):
             if block == ' ' and previous in '►─':
                 blocks[y][x] = previous
                 blocks[y][x - 1] = '─'
+                owners[y][x] = owners[y][x - 1]
 
     size = max(len(_) for _ in words)
-    for row, word, type in zip(blocks, words, types):
-        word = word.ljust(size)
+    for row, owner, word, type in zip(blocks, owners, words, types):
+        yield row, owner, word.ljust(size), type
+
+
+@profiled
+def format_dep_ascii_markup(words, deps):
+    for row, _, word, type in dep_ascii_rows(words, deps):
         type = type or ''
         yield ' '.join([''.join(row), word, type])
 
 
+#######
+#
+#   ANSI
+#
+####
+
+
+def format_dep_ansi_markup(words, deps, palette=PALETTE, colors=None):
+    escapes = Escapes(colors)
+    for row, owner, word, type in dep_ascii_rows(words, deps):
+        parts, start = [], 0
+        for stop in range(1, len(row) + 1):
+            if stop == len(row) or owner[stop] != owner[start]:
+                chars = ''.join(row[start:stop])
+                if chars.isspace():
+                    parts.append(chars)
+                else:
+                    color = palette.get(owner[start])
+                    parts.append(escapes.paint(chars, color.line))
+                start = stop
+        parts.append(' ')
+        parts.append(word)
+        parts.append(' ')
+        if type:
+            parts.append(escapes.paint(type, palette.get(type).text))
+        yield ''.join(parts)
+
+
+#######
+#
+#   SVG
+#
+####
+
+
+SVG_ARROW = (
+    '<marker id="%s" viewBox="0 0 10 10" refX="10" refY="5" '
+    'markerWidth="6" markerHeight="6" orient="auto">'
+    '<path d="M0,0 L10,5 L0,10 z" fill="%s"/></marker>'
+)
+
+
+def svg_word_boxes(words, char_width, word_gap):
+    x = 0
+    for word in words:
+        width = max(len(word), 1) * char_width
+        yield x, x + width
+        x += width + word_gap
+
+
+def svg_arc_ends(arcs, boxes):
+    # like html sections, on every word arcs coming from left take
+    # left half, higher level is closer to word edge
+    ends = [[] for _ in boxes]
+    for index, (start, stop, _, _, level) in enumerate(arcs):
+        ends[start].append((RIGHT, -level, index))
+        ends[stop].append((LEFT, -level, index))
+
+    xs = {}
+    for (left, right), items in zip(boxes, ends):
+        items.sort()
+        lefts = [_ for _ in items if _[0] == LEFT]
+        rights = [_ for _ in items if _[0] == RIGHT]
+        step = (right - left) / (len(items) + 1)
+        for offset, (side, _, index) in enumerate(lefts, 1):
+            xs[index, side] = left + offset * step
+        for offset, (side, _, index) in enumerate(rights, 1):
+            xs[index, side] = right - offset * step
+    return xs
+
+
+def svg_arc_path(x1, x2, base, top, radius):
+    # from source to target, arrow marker sits at path end
+    radius = min(radius, abs(x2 - x1) / 2, base - top)
+    sign = 1 if x2 > x1 else -1
+    return 'M%.1f,%d L%.1f,%.1f Q%.1f,%d %.1f,%d L%.1f,%d Q%.1f,%d %.1f,%.1f L%.1f,%d' % (
+        x1, base,
+        x1, top + radius,
+        x1, top, x1 + sign * radius, top,
+        x2 - sign * radius, top,
+        x2, top, x2, top + radius,
+        x2, base
+    )
+
+
+def format_dep_svg_markup(words, deps,
+                          font_size=13, char_width=None, word_gap=None,
+                          arc_radius=5, arc_gap=12):
+    # one svg with path per arc, cost scales with number of arcs not
+    # dom depth. Word width is estimated from monospace char width
+    if char_width is None:
+        char_width = font_size * 0.6
+    if word_gap is None:
+        word_gap = char_width * 2
+
+    size = len(words)
+    arcs = [
+        (start, stop, direction, type, level)
+        for start, stop, direction, type, level in prepare_arcs(deps)
+        if 0 <= start and stop < size
+    ]
+    boxes = list(svg_word_boxes(words, char_width, word_gap))
+    xs = svg_arc_ends(arcs, boxes)
+
+    height = max_arc_level(arcs) + 2
+    base = arc_gap * height + font_size // 2  # extra gap for type text
+    width = boxes[-1][1] if boxes else 0
+    total = base + font_size * 2
+
+    yield (
+        '<svg xmlns="http://www.w3.org/2000/svg" class="tex2jax_ignore" '
+        'width="%d" height="%d" viewBox="0 0 %d %d" '
+        'font-family="monospace" font-size="%d">' % (
+            width, total, width, total, font_size
+        )
+    )
+    # many svgs share html page, marker id is unique per markup
+    scope = css_scope([words, arcs, font_size, char_width, word_gap])
+    arrow = scope + '-arrow'
+    yield '<defs>%s</defs>' % (SVG_ARROW % (arrow, GREY.line.value))
+
+    yield '<g fill="none" stroke="%s" marker-end="url(#%s)">' % (
+        GREY.line.value, arrow
+    )
+    for index, (start, stop, direction, _, level) in enumerate(arcs):
+        x1, x2 = xs[index, RIGHT], xs[index, LEFT]
+        if direction == LEFT:
+            x1, x2 = x2, x1
+        top = base - arc_gap * (level + 1)
+        yield '<path d="%s"/>' % svg_arc_path(x1, x2, base, top, arc_radius)
+    yield '</g>'
+
+    yield '<g fill="%s" font-size="%d" text-anchor="middle">' % (
+        GREY.text.value, font_size * 3 // 4
+    )
+    for index, (start, stop, _, type, level) in enumerate(arcs):
+        if type:
+            x = (xs[index, RIGHT] + xs[index, LEFT]) / 2
+            y = base - arc_gap * (level + 1) - 2
+            yield '<text x="%.1f" y="%d">%s</text>' % (x, y, escape(type))
+    yield '</g>'
+
+    yield '<g fill="black">'
+    for (left, _), word in zip(boxes, words):
+        yield '<text x="%.1f" y="%d">%s</text>' % (
+            left, base + font_size, escape(word)
+        )
+    yield '</g>'
+    yield '</svg>'
+
+
+#######
+#
+#   PAGE
+#
+####
+
+
+def dep_pages(words, deps, page_size):
+    # cut words where no arc crosses, every page except last has at
+    # least page_size words
+    groups, reach = {}, {}
+    for source, target, type in prepare_deps(deps):
+        start, stop = min(source, target), max(source, target)
+        groups.setdefault(start, []).append((source, target, type))
+        reach[start] = max(reach.get(start, start), stop)
+
+    first, bound, deps = 0, 0, []
+    for index in range(len(words)):
+        bound = max(bound, reach.get(index, index))
+        deps.extend(groups.get(index, ()))
+        if index + 1 - first >= page_size and bound <= index:
+            yield words[first:index + 1], [
+                (source - first, target - first, type)
+                for source, target, type in deps
+            ]
+            first, deps = index + 1, []
+
+    if first < len(words) or not first:
+        yield words[first:], [
+            (source - first, target - first, type)
+            for source, target, type in deps
+        ]
+
+
+def page_dep_markup(words, deps, page_size=100, **kwargs):
+    for words, deps in dep_pages(words, deps, page_size):
+        yield format_dep_markup(words, deps, **kwargs)
+
+
+#######
+#
+#   WRITE
+#
+#####
+
+
+def write_dep_markup(words, deps, file, size=2 ** 16, **kwargs):
+    lines = format_dep_markup(words, deps, **kwargs)
+    write_lines(lines, file, size)
+
+
+def write_dep_svg_markup(words, deps, file, size=2 ** 16, **kwargs):
+    lines = format_dep_svg_markup(words, deps, **kwargs)
+    write_lines(lines, file, size)
+
+
+def write_dep_ascii_markup(words, deps, file, size=2 ** 16):
+    lines = format_dep_ascii_markup(words, deps)
+    write_lines(lines, file, size, separator='\n')
+
+
 ######
 #
 #  SHOW
@@ -433,13 +933,28 @@ def format_dep_ascii_markup(words, deps):
 ######
 
 
-def show_dep_markup(words, deps, **kwargs):
+def show_dep_markup(words, deps, page_size=None, **kwargs):
+    if page_size:
+        pages = page_dep_markup(words, deps, page_size, **kwargs)
+        return show_html_pages(pages)
     deps = prepare_deps(deps)
     lines = format_dep_markup(words, deps, **kwargs)
     show_html(lines)
 
 
+def show_dep_svg_markup(words, deps, **kwargs):
+    deps = prepare_deps(deps)
+    lines = format_dep_svg_markup(words, deps, **kwargs)
+    show_html(lines)
+
+
 def show_dep_ascii_markup(words, deps):
     deps = prepare_deps(deps)
     for line in format_dep_ascii_markup(words, deps):
         print(line)
+
+
+def show_dep_ansi_markup(words, deps, file=None, **kwargs):
+    deps = prepare_deps(deps)
+    lines = format_dep_ansi_markup(words, deps, **kwargs)
+    show_ansi(lines, file)
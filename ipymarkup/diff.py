@@ -0,0 +1,305 @@
+
+from collections import deque
+
+from .show import show_html
+from .record import Record
+from .palette import (
+    Palette,
+    GREEN,
+    ORANGE,
+    PURPLE,
+    RED,
+    BLUE
+)
+from .span import (
+    Span,
+    prepare_spans,
+    order_spans,
+    get_multilines,
+    max_level,
+    format_span_lines,
+    format_span_ascii_lines,
+    line_markup_open
+)
+from .stats import profiled, timed, lazy, count
+
+
+MATCH = 'match'  # same bounds and type
+TYPE = 'type'  # same bounds, other type
+BOUNDARY = 'boundary'  # overlap, other bounds
+MISSED = 'missed'  # gold only, false negative
+EXTRA = 'extra'  # pred only, false positive
+
+DIFF_KINDS = [MATCH, TYPE, BOUNDARY, MISSED, EXTRA]
+DIFF_COLORS = {
+    MATCH: GREEN,
+    TYPE: ORANGE,
+    BOUNDARY: PURPLE,
+    MISSED: RED,
+    EXTRA: BLUE
+}
+
+
+#######
+#
+#   ALIGN
+#
+######
+
+
+class SpanDiff(Record):
+    __attributes__ = ['kind', 'gold', 'pred']
+    __slots__ = ['kind', 'gold', 'pred']
+
+    def __init__(self, kind, gold=None, pred=None):
+        self.kind = kind
+        self.gold = gold
+        self.pred = pred
+
+
+def span_bounds(span):
+    start, stop, _ = span
+    return start, stop
+
+
+def span_type(span):
+    _, _, type = span
+    return type
+
+
+def sort_spans(spans):
+    # sorted input is common, timsort is linear on it
+    return sorted(prepare_spans(spans), key=span_bounds)
+
+
+def pair_order(span, other):
+    # same type, then larger overlap, then closer bounds
+    start, stop, type = span
+    other_start, other_stop, other_type = other
+    overlap = min(stop, other_stop) - max(start, other_start)
+    distance = abs(start - other_start) + abs(stop - other_stop)
+    return type == other_type, overlap, -distance
+
+
+def align_span(span, others, own, gold):
+    # others are unmatched spans of other side, ordered, start before
+    # span. Ended ones are unmatched for good and leave queue, so queue
+    # is as deep as nesting of unmatched spans. Best of overlapping
+    # ones is paired, otherwise span waits for later spans of other side
+    start, _, _ = span
+    best, index = None, None
+    active = []
+    for other in others:
+        _, stop, _ = other
+        if stop <= start:
+            if gold:
+                yield SpanDiff(EXTRA, pred=other)
+            else:
+                yield SpanDiff(MISSED, gold=other)
+            continue
+
+        order = pair_order(span, other)
+        if best is None or order > best:
+            best, index = order, len(active)
+        active.append(other)
+
+    if index is not None:
+        other = active.pop(index)
+        if gold:
+            yield SpanDiff(BOUNDARY, span, other)
+        else:
+            yield SpanDiff(BOUNDARY, other, span)
+    else:
+        own.append(span)
+
+    if len(active) != len(others):
+        others.clear()
+        others.extend(active)
+
+
+def take_bounds(span, spans):
+    # span and next spans with same bounds, first span after them
+    bounds = span_bounds(span)
+    run = [span]
+    for span in spans:
+        if span_bounds(span) != bounds:
+            return run, span
+        run.append(span)
+    return run, None
+
+
+def pair_bounds(golds, preds):
+    # spans with equal bounds, same types are paired first, rest in
+    # order as TYPE. Returns unpaired spans, only one side has them
+    if len(golds) == 1 and len(preds) == 1:  # common case
+        g, p = golds[0], preds[0]
+        kind = MATCH if span_type(g) == span_type(p) else TYPE
+        yield SpanDiff(kind, g, p)
+        return (), ()
+
+    positions = {}
+    for index, span in enumerate(preds):
+        positions.setdefault(span_type(span), deque()).append(index)
+
+    unpaired = list(preds)
+    rest = []
+    for span in golds:
+        same = positions.get(span_type(span))
+        if same:
+            index = same.popleft()
+            yield SpanDiff(MATCH, span, preds[index])
+            unpaired[index] = None
+        else:
+            rest.append(span)
+
+    others = [_ for _ in unpaired if _ is not None]
+    for g, p in zip(rest, others):
+        yield SpanDiff(TYPE, g, p)
+
+    size = min(len(rest), len(others))
+    return rest[size:], others[size:]
+
+
+def diff_spans(gold, pred):
+    # One merge pass over gold and pred ordered by (start, stop). Runs
+    # of equal bounds are MATCH or TYPE. Smaller span can not have equal
+    # bounds with later spans, it is paired with overlapping unmatched
+    # span of other side as BOUNDARY or waits in queue. Only one side
+    # queue is not empty, it holds unmatched spans that may still overlap
+    gold = iter(sort_spans(gold))
+    pred = iter(sort_spans(pred))
+    missed, extra = deque(), deque()
+
+    g, p = next(gold, None), next(pred, None)
+    while g is not None or p is not None:
+        if g is not None and p is not None:
+            bounds = span_bounds(g)
+            other = span_bounds(p)
+            if bounds == other:
+                golds, g = take_bounds(g, gold)
+                preds, p = take_bounds(p, pred)
+                golds, preds = yield from pair_bounds(golds, preds)
+                for span in golds:
+                    yield from align_span(span, extra, missed, gold=True)
+                for span in preds:
+                    yield from align_span(span, missed, extra, gold=False)
+                continue
+            is_gold = bounds < other
+        else:
+            is_gold = p is None
+
+        if is_gold:
+            yield from align_span(g, extra, missed, gold=True)
+            g = next(gold, None)
+        else:
+            yield from align_span(p, missed, extra, gold=False)
+            p = next(pred, None)
+
+    for span in missed:
+        yield SpanDiff(MISSED, gold=span)
+    for span in extra:
+        yield SpanDiff(EXTRA, pred=span)
+
+
+def count_span_diffs(diffs, counts=None):
+    # counts can be shared between docs for corpus report
+    if counts is None:
+        counts = dict.fromkeys(DIFF_KINDS, 0)
+    for diff in diffs:
+        counts[diff.kind] += 1
+    return counts
+
+
+#######
+#
+#   SPANS
+#
+######
+
+
+def type_label(span):
+    return span_type(span) or ''
+
+
+def diff_labels(diff):
+    # label tells kind without colors, in ascii too: -missed, +extra,
+    # gold→pred type, ~-gold ~+pred bounds
+    kind, gold, pred = diff
+    if kind == MATCH:
+        yield gold, type_label(gold)
+    elif kind == TYPE:
+        yield gold, '%s→%s' % (type_label(gold), type_label(pred))
+    elif kind == BOUNDARY:
+        yield gold, '~-' + type_label(gold)
+        yield pred, '~+' + type_label(pred)
+    elif kind == MISSED:
+        yield gold, '-' + type_label(gold)
+    elif kind == EXTRA:
+        yield pred, '+' + type_label(pred)
+    else:
+        raise ValueError('Unexpected kind: %r' % kind)
+
+
+def diff_markup_spans(diffs, palette):
+    # labels are spans types, palette maps label to color of kind
+    for diff in diffs:
+        color = DIFF_COLORS[diff.kind]
+        for span, label in diff_labels(diff):
+            palette.set(label, color)
+            start, stop, _ = span
+            yield Span(start, stop, label)
+
+
+def prepare_diff(gold, pred, palette):
+    diffs = lazy('diff_spans', diff_spans(gold, pred))
+    spans = diff_markup_spans(diffs, palette)
+    spans = timed('order_spans', order_spans, spans)
+    multilines = timed('get_multilines', list, get_multilines(spans))
+    count('spans', len, spans)
+    count('max_level', max_level, multilines)
+    return multilines
+
+
+#######
+#
+#   FORMAT
+#
+######
+
+
+@profiled
+def format_span_diff_markup(text, gold, pred,
+                            width=80, line_gap=8, line_width=3,
+                            label_size=11, background='white'):
+    palette = Palette()
+    multilines = prepare_diff(gold, pred, palette)
+
+    yield line_markup_open()
+    yield from format_span_lines(
+        text, multilines, palette, width, line_gap,
+        line_width, label_size, background
+    )
+    yield '</div>'
+
+
+@profiled
+def format_span_diff_ascii_markup(text, gold, pred, width=70):
+    multilines = prepare_diff(gold, pred, Palette())
+    yield from format_span_ascii_lines(text, multilines, width)
+
+
+#######
+#
+#   SHOW
+#
+#####
+
+
+def show_span_diff_markup(text, gold, pred, **kwargs):
+    lines = format_span_diff_markup(text, gold, pred, **kwargs)
+    show_html(lines)
+
+
+def show_span_diff_ascii_markup(text, gold, pred, **kwargs):
+    for line in format_span_diff_ascii_markup(text, gold, pred, **kwargs):
+        print(line)
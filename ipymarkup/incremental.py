@@ -0,0 +1,160 @@
+
+from bisect import bisect_left, bisect_right
+from itertools import count
+
+from .palette import PALETTE
+from .span import (
+    prepare_span,
+    get_multilines,
+    wrap,
+    distribute_multilines,
+    line_tags,
+    line_markup_open,
+    format_span_line
+)
+
+
+#######
+#
+#   LINE
+#
+######
+
+
+class LineMarkup(object):
+    # Keeps wrapped lines and level assignment of line markup. Text
+    # does not change so wrapping is fixed. Span levels depend only on
+    # spans it transitively overlaps, so add and remove recompute
+    # levels of that component and render wrapped lines it touches.
+    # Equal start spans are ordered by insertion, markup is same as
+    # format_span_line_markup over spans in insertion order
+
+    def __init__(self, text, spans=(), palette=PALETTE,
+                 width=80, line_gap=8, line_width=3,
+                 label_size=11, background='white'):
+        self.text = text
+        self.tags = line_tags(
+            palette, line_gap, line_width,
+            label_size, background
+        )
+        self.wraps = list(wrap(text, width))
+        self.wrap_stops = [stop for _, stop, _ in self.wraps]
+
+        self.ids = count()
+        self.spans = {}  # (start, stop, type) -> [order, count]
+        for span in spans:
+            self.insert(prepare_span(span))
+
+        spans = sorted(self.spans, key=self.span_order)
+        self.multilines = list(get_multilines(spans))
+        self.starts = [_.start for _ in self.multilines]
+        self.stops = [_.stop for _ in self.multilines]
+
+    def __len__(self):
+        return len(self.wraps)
+
+    def span_order(self, key):
+        start, _, _ = key
+        order, _ = self.spans[key]
+        return start, order
+
+    def insert(self, span):
+        key = tuple(span)
+        if key in self.spans:
+            self.spans[key][1] += 1
+            return False
+        self.spans[key] = [next(self.ids), 1]
+        return True
+
+    def delete(self, span):
+        key = tuple(span)
+        if key not in self.spans:
+            raise ValueError('no span: %r' % (span,))
+        self.spans[key][1] -= 1
+        if self.spans[key][1]:
+            return False
+        del self.spans[key]
+        return True
+
+    def component(self, start, stop):
+        # multis of spans that transitively overlap start, stop
+        while True:
+            first = bisect_right(self.stops, start)
+            last = bisect_left(self.starts, stop)
+            low, high = start, stop
+            for multi in self.multilines[first:last]:
+                for line in multi.lines:
+                    low = min(low, line.start)
+                    high = max(high, line.stop)
+            if (low, high) == (start, stop):
+                return first, last
+            start, stop = low, high
+
+    def relayout(self, span):
+        start, stop, _ = span
+        first, last = self.component(start, stop)
+        multilines = self.multilines[first:last]
+        if multilines:
+            start = min(start, multilines[0].start)
+            stop = max(stop, multilines[-1].stop)
+
+        keys = {
+            (line.start, line.stop, line.type)
+            for multi in multilines
+            for line in multi.lines
+        }
+        keys.add(tuple(span))
+        spans = sorted(
+            (_ for _ in keys if _ in self.spans),
+            key=self.span_order
+        )
+        multilines = list(get_multilines(spans))
+        self.multilines[first:last] = multilines
+        self.starts[first:last] = [_.start for _ in multilines]
+        self.stops[first:last] = [_.stop for _ in multilines]
+        return start, stop
+
+    def add(self, span):
+        span = prepare_span(span)
+        if not self.insert(span):
+            return {}  # equal spans are drawn once
+        start, stop = self.relayout(span)
+        return self.render(start, stop)
+
+    def remove(self, span):
+        span = prepare_span(span)
+        if not self.delete(span):
+            return {}
+        start, stop = self.relayout(span)
+        return self.render(start, stop)
+
+    def lines(self, first=0, last=None):
+        # wrapped line gets multis from first one that ends after
+        # previous line, same as distribute_multilines over all lines
+        if last is None:
+            last = len(self.wraps)
+        previous = self.wrap_stops[first - 1] if first else float('-inf')
+        index = bisect_right(self.stops, previous)
+        multilines = map(
+            self.multilines.__getitem__,
+            range(index, len(self.multilines))
+        )
+        wraps = distribute_multilines(self.wraps[first:last], multilines)
+        for offset, line, multilines in wraps:
+            yield ''.join(format_span_line(
+                offset, line, multilines,
+                *self.tags
+            ))
+
+    def render(self, start, stop):
+        # lines that may get multis from start, stop, including empty
+        # slices in whitespace dropped between lines
+        first = bisect_right(self.wrap_stops, start)
+        last = min(bisect_left(self.wrap_stops, stop) + 1, len(self.wraps))
+        lines = self.lines(first, last)
+        return dict(zip(range(first, last), lines))
+
+    def markup(self):
+        yield line_markup_open()
+        yield from self.lines()
+        yield '</div>'
@@ -1,5 +1,6 @@
 
 import re
+from zlib import crc32
 
 from .record import Record
 
@@ -13,6 +14,7 @@ from .record import Record
 
 class Rgb(Record):
     __attributes__ = ['value']
+    __slots__ = ['value']
 
     def __init__(self, value):
         if not re.match(r'^#[0-9a-f]{6}$', value):
@@ -22,6 +24,7 @@ class Rgb(Record):
 
 class MaterialRgb(Rgb):
     __attributes__ = ['name', 'key']
+    __slots__ = ['name', 'key']
 
     # https://material.io/design/color/the-color-system.html#tools-for-picking-colors
     values = {
@@ -67,6 +70,7 @@ material = MaterialRgb
 
 class Color(Record):
     __attributes__ = ['name']
+    __slots__ = ['name', 'background', 'border', 'text', 'line']
 
     def __init__(self, name, background=None, border=None, text=None, line=None):
         self.name = name
@@ -134,6 +138,7 @@ GREY = Color(
 
 class Palette(Record):
     __attributes__ = ['colors', 'cache']
+    __slots__ = ['colors', 'cache']
 
     def __init__(self, colors=None, cache=None):
         if not colors:
@@ -161,6 +166,35 @@ class Palette(Record):
     def set(self, type, color):
         self.cache[type] = color
 
+    def freeze(self):
+        return FrozenPalette(self.colors, self.cache)
+
+
+class FrozenPalette(Palette):
+    # Snapshot of palette that is never changed. Unknown types get color
+    # by stable hash of type, so get is safe to call from many threads
+    # and gives same colors in every process
+    __slots__ = []
+
+    def __init__(self, colors=None, cache=None):
+        self.colors = list(colors or [])
+        self.cache = dict(cache or {})
+
+    def add(self, color):
+        raise TypeError('frozen palette')
+
+    def set(self, type, color):
+        raise TypeError('frozen palette')
+
+    def get(self, type):
+        color = self.cache.get(type)
+        if color is None:
+            if not self.colors:
+                raise ValueError('empty palette')
+            index = crc32(repr(type).encode('utf8')) % len(self.colors)
+            color = self.colors[index]
+        return color
+
 
 PALETTE = Palette([
     BLUE, GREEN, RED,
@@ -1,30 +1,43 @@
 
+from operator import attrgetter
+
+
+def values_getter(attributes):
+    if not attributes:
+        return lambda _: ()
+    elif len(attributes) == 1:
+        getter = attrgetter(attributes[0])
+        return lambda _: (getter(_),)
+    return attrgetter(*attributes)
+
+
 class Record(object):
     __attributes__ = []
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.__values__ = staticmethod(values_getter(cls.__attributes__))
 
     def __eq__(self, other):
         return (
             type(self) == type(other)
-            and all(
-                (getattr(self, _) == getattr(other, _))
-                for _ in self.__attributes__
-            )
+            and self.__values__(self) == other.__values__(other)
         )
 
     def __ne__(self, other):
         return not self == other
 
     def __iter__(self):
-        return (getattr(self, _) for _ in self.__attributes__)
+        return iter(self.__values__(self))
 
     def __hash__(self):
-        return hash(tuple(self))
+        return hash(self.__values__(self))
 
     def __repr__(self):
         name = self.__class__.__name__
         args = ', '.join(
-            repr(getattr(self, _))
-            for _ in self.__attributes__
+            repr(_) for _ in self.__values__(self)
         )
         return '{name}({args})'.format(
             name=name,
@@ -1,7 +1,68 @@
 
+import sys
+
 
 def show_html(lines):
     from IPython.display import display, HTML
 
     html = ''.join(lines)
     display(HTML(html))
+
+
+class Pager(object):
+    # one output updated in place, next page is rendered on demand,
+    # only current page is kept in kernel and browser
+    def __init__(self, pages):
+        self.pages = iter(pages)
+        self.index = -1
+        self.handle = None
+
+    def next(self):
+        from IPython.display import display, HTML
+
+        page = next(self.pages, None)
+        if page is None:
+            return False
+
+        html = HTML(''.join(page))
+        if self.handle is None:
+            self.handle = display(html, display_id=True)
+        else:
+            self.handle.update(html)
+        self.index += 1
+        return True
+
+    def __repr__(self):
+        return 'Pager(index=%d)' % self.index
+
+
+def show_html_pages(pages):
+    pager = Pager(pages)
+    pager.next()
+    return pager
+
+
+def write_lines(lines, file, size=2 ** 16, separator=''):
+    # one write per size chars instead of write per fragment, full
+    # markup is never held in memory
+    buffer, length = [], 0
+    append = buffer.append
+    for line in lines:
+        append(line)
+        length += len(line)
+        if separator:
+            append(separator)
+            length += len(separator)
+        if length >= size:
+            file.write(''.join(buffer))
+            buffer.clear()
+            length = 0
+    if buffer:
+        file.write(''.join(buffer))
+
+
+def show_ansi(lines, file=None, size=2 ** 16):
+    if file is None:
+        file = sys.stdout
+    write_lines(lines, file, size, separator='\n')
+    file.flush()
@@ -1,14 +1,19 @@
 
 import re
+from math import ceil
+from bisect import insort, bisect_left
+from heapq import heappush, heappop
+from itertools import repeat, islice
 from collections import defaultdict
 from textwrap import TextWrapper
 from html import escape
 
-from intervaltree import IntervalTree as Intervals
-
-from .show import show_html
+from .show import show_html, show_html_pages, show_ansi, write_lines
 from .record import Record
 from .palette import PALETTE
+from .css import css_scope, format_css
+from .ansi import Escapes, terminal_width
+from .stats import profiled, timed, lazy, count
 
 
 ######
@@ -20,6 +25,7 @@ from .palette import PALETTE
 
 class Span(Record):
     __attributes__ = ['start', 'stop', 'type']
+    __slots__ = ['start', 'stop', 'type']
 
     def __init__(self, start, stop, type=None):
         if start >= stop:
@@ -30,6 +36,8 @@ class Span(Record):
 
 
 def order_spans(spans):
+    if isinstance(spans, SpanArray):
+        return spans.ordered()
     return sorted(spans, key=lambda _: _.start)
 
 
@@ -55,8 +63,103 @@ def prepare_span(span):
 
 
 def prepare_spans(spans):
+    if isinstance(spans, SpanArray):
+        return spans  # validated on init
+    return (prepare_span(_) for _ in spans)
+
+
+def check_spans_order(spans):
+    previous = None
     for span in spans:
-        yield prepare_span(span)
+        start, _, _ = span
+        if previous is not None and start < previous:
+            raise ValueError('unordered span: %r' % (span,))
+        previous = start
+        yield span
+
+
+#######
+#
+#   ARRAY
+#
+#####
+
+
+class SpanArray(object):
+    # Columnar spans: starts, stops and type codes, code is index in
+    # vocab, -1 means no type. Iterates (start, stop, type) tuples,
+    # no Span objects are created
+
+    def __init__(self, starts, stops, types=None, vocab=None):
+        import numpy as np
+
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.asarray(stops, dtype=np.int64)
+        if starts.shape != stops.shape or starts.ndim != 1:
+            raise ValueError('bad shapes: %r, %r' % (starts.shape, stops.shape))
+
+        invert = np.flatnonzero(starts >= stops)
+        if len(invert):
+            index = invert[0]
+            start, stop = int(starts[index]), int(stops[index])
+            raise ValueError('invert span: (%r, %r)' % (start, stop))
+
+        if types is not None:
+            types = np.asarray(types, dtype=np.int64)
+            if types.shape != starts.shape:
+                raise ValueError('bad shape: %r' % (types.shape,))
+            vocab = list(vocab or [])
+            if len(types) and (types.min() < -1 or types.max() >= len(vocab)):
+                raise ValueError('type codes out of vocab')
+
+        self.starts = starts
+        self.stops = stops
+        self.types = types
+        self.vocab = vocab
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(
+            self.starts.tolist(),
+            self.stops.tolist(),
+            self.labels()
+        )
+
+    def labels(self):
+        if self.types is None:
+            return repeat(None, len(self))
+
+        import numpy as np
+
+        vocab = np.empty(len(self.vocab) + 1, dtype=object)
+        vocab[:-1] = self.vocab  # -1 -> last -> None
+        return vocab[self.types].tolist()
+
+    def take(self, order):
+        array = SpanArray.__new__(SpanArray)
+        array.starts = self.starts[order]
+        array.stops = self.stops[order]
+        array.types = None if self.types is None else self.types[order]
+        array.vocab = self.vocab
+        return array
+
+    def ordered(self):
+        import numpy as np
+
+        order = np.argsort(self.starts, kind='stable')
+        return self.take(order)
+
+    @property
+    def flat(self):
+        # ordered spans, no span overlaps previous ones
+        import numpy as np
+
+        if len(self) < 2:
+            return True
+        stops = np.maximum.accumulate(self.stops[:-1])
+        return bool(np.all(self.starts[1:] >= stops))
 
 
 #########
@@ -68,6 +171,7 @@ def prepare_spans(spans):
 
 class Line(Record):
     __attributes__ = ['start', 'stop', 'type', 'level']
+    __slots__ = ['start', 'stop', 'type', 'level']
 
     def __init__(self, start, stop, type, level):
         self.start = start
@@ -78,6 +182,7 @@ class Line(Record):
 
 class Multiline(Record):
     __attributes__ = ['start', 'stop', 'lines']
+    __slots__ = ['start', 'stop', 'lines']
 
     def __init__(self, start, stop, lines=None):
         self.start = start
@@ -99,7 +204,9 @@ def get_free_level(intervals):
     return max(levels) + 1
 
 
-def get_multilines(spans):
+def get_intervals_multilines(spans):
+    from intervaltree import IntervalTree as Intervals
+
     intervals = Intervals()
     lines = []
     for start, stop, type in spans:
@@ -126,6 +233,79 @@ def get_multilines(spans):
         yield Multiline(start, stop, lines)
 
 
+def sweep_lines(spans):
+    previous, seen = None, []
+    for start, stop, type in spans:
+        if start != previous:
+            previous, seen = start, []
+        # IntervalTree keeps only one copy of equal intervals
+        key = stop, type
+        if key in seen:
+            continue
+        seen.append(key)
+        yield Line(start, stop, type, level=None)
+
+
+def sweep_multilines(point, limit, levels, lines, stops):
+    while stops and point < limit:
+        stop = min(stops[0][0], limit)
+        yield Multiline(point, stop, [lines[_] for _ in levels])
+        point = stop
+        while stops and stops[0][0] == point:
+            _, level = heappop(stops)
+            del lines[level]
+            del levels[bisect_left(levels, level)]
+
+
+def get_sweep_multilines(spans):
+    # spans are ordered by start, active lines have distinct levels
+    levels, lines, stops = [], {}, []
+    point = None
+    for line in sweep_lines(spans):
+        if point is not None:
+            yield from sweep_multilines(point, line.start, levels, lines, stops)
+        point = line.start
+
+        if not levels or levels[0] > 0:
+            line.level = 0
+        else:
+            line.level = levels[-1] + 1
+
+        insort(levels, line.level)
+        lines[line.level] = line
+        heappush(stops, (line.stop, line.level))
+
+    if point is not None:
+        yield from sweep_multilines(point, float('inf'), levels, lines, stops)
+
+
+SWEEP = 'sweep'
+INTERVALS = 'intervals'
+
+
+def get_flat_multilines(spans):
+    for start, stop, type in spans:
+        line = Line(start, stop, type, level=0)
+        yield Multiline(start, stop, [line])
+
+
+def max_level(multilines):
+    return max(
+        (line.level for multi in multilines for line in multi.lines),
+        default=-1
+    )
+
+
+def get_multilines(spans, mode=SWEEP):
+    if mode == SWEEP:
+        if isinstance(spans, SpanArray) and spans.flat:
+            return get_flat_multilines(spans)
+        return get_sweep_multilines(spans)
+    elif mode == INTERVALS:
+        return get_intervals_multilines(spans)
+    raise ValueError('bad mode: %r' % mode)
+
+
 ###########
 #
 #   WRAP
@@ -152,24 +332,155 @@ def Wrapper(width):
     ).wrap
 
 
-def wrap(text, width):
+PARAGRAPH = re.compile(r'([^\n\r]+)')
+
+
+def read_paragraphs(file, size=2 ** 16):
+    offset, buffer = 0, ''
+    while True:
+        chunk = file.read(size)
+        buffer += chunk
+        position = 0
+        for match in PARAGRAPH.finditer(buffer):
+            if chunk and match.end() == len(buffer):
+                break  # paragraph may continue in next chunk
+            yield offset + match.start(), match.group(1)
+            position = match.end()
+        else:
+            position = len(buffer)
+        offset += position
+        buffer = buffer[position:]
+        if not chunk:
+            break
+
+
+def text_paragraphs(text):
+    if isinstance(text, str):
+        for match in PARAGRAPH.finditer(text):
+            yield match.start(), match.group(1)
+    else:
+        yield from read_paragraphs(text)
+
+
+def wrap_textwrap(text, width):
     wrapper = Wrapper(width)
-    matches = re.finditer(r'([^\n\r]+)', text)
-    for match in matches:
-        start = match.start()
-        line = match.group(1)
+    for start, line in text_paragraphs(text):
         for sub in wrapper(line):
             stop = start + len(sub)
             yield start, stop, sub
             start = stop
 
 
-def distribute_multilines(wraps, multilines):
+# Same chunks as TextWrapper, words and whitespace, hyphenated words are
+# split after hyphen
+WORDSEP = TextWrapper.wordsep_re
+
+# Newer TextWrapper breaks too long chunk after last hyphen that fits
+BREAK_LONG_ON_HYPHENS = Wrapper(5)('12-345678')[0] == '12-'
+
+
+def chunk_bounds(text, keep=()):
+    # keep are sorted (start, stop), no bounds inside them
+    bounds = [0]
+    for match in WORDSEP.finditer(text):
+        for bound in match.span():
+            if bound > bounds[-1]:
+                bounds.append(bound)
+    if len(text) > bounds[-1]:
+        bounds.append(len(text))
+
+    if keep:
+        selected = []
+        index = 0
+        for bound in bounds:
+            while index < len(keep) and keep[index][1] <= bound:
+                index += 1
+            if index < len(keep) and keep[index][0] < bound:
+                continue
+            selected.append(bound)
+        bounds = selected
+    return bounds
+
+
+def wrap_paragraph(text, width, keep=()):
+    # TextWrapper._wrap_chunks without drop whitespace and indents, on
+    # offsets of chunks instead of chunk strings
+    if width <= 0:
+        raise ValueError('invalid width %r (must be > 0)' % width)
+
+    bounds = chunk_bounds(text, keep)
+    size = len(bounds) - 1
+    index = 0
+    position = 0
+    while index < size:
+        start = position
+        while index < size and bounds[index + 1] - start <= width:
+            index += 1
+            position = bounds[index]
+
+        if index < size and bounds[index + 1] - position > width:
+            # too long chunk, put as much as fits
+            end = start + width
+            if BREAK_LONG_ON_HYPHENS:
+                hyphen = text.rfind('-', position, end)
+                if hyphen > position and text[position:hyphen].strip('-'):
+                    end = hyphen + 1
+            position = end
+
+        yield start, position
+
+
+def wrap_offsets(text, width, keep=()):
     index = 0
+    for start, line in text_paragraphs(text):
+        stop = start + len(line)
+        while index < len(keep) and keep[index][1] <= start:
+            index += 1
+
+        selected = []
+        for keep_start, keep_stop in islice(keep, index, None):
+            if keep_start >= stop:
+                break
+            selected.append((
+                max(keep_start, start) - start,
+                min(keep_stop, stop) - start
+            ))
+
+        for line_start, line_stop in wrap_paragraph(line, width, selected):
+            sub = line[line_start:line_stop]
+            yield start + line_start, start + line_stop, sub
+
+
+def keep_ranges(spans):
+    # merge overlapping spans, break between touching spans is ok
+    ranges = []
+    for start, stop, _ in spans:
+        if ranges and start < ranges[-1][1]:
+            if stop > ranges[-1][1]:
+                ranges[-1] = ranges[-1][0], stop
+        else:
+            ranges.append((start, stop))
+    return ranges
+
+
+OFFSETS = 'offsets'
+TEXTWRAP = 'textwrap'
+
+
+def wrap(text, width, mode=OFFSETS, keep=()):
+    if mode == OFFSETS:
+        return wrap_offsets(text, width, keep)
+    elif mode == TEXTWRAP:
+        return wrap_textwrap(text, width)
+    raise ValueError('bad mode: %r' % mode)
+
+
+def distribute_multilines(wraps, multilines):
+    multilines = iter(multilines)
+    multi = next(multilines, None)
     for start, stop, line in wraps:
         slices = []
-        while index < len(multilines):
-            multi = multilines[index]
+        while multi is not None:
             if multi.start >= stop:
                 break
             slice = Multiline(
@@ -179,17 +490,41 @@ def distribute_multilines(wraps, multilines):
             )
             slices.append(slice)
             if multi.stop <= stop:
-                index += 1
+                multi = next(multilines, None)
             else:
                 break
         yield start, line, slices
 
 
-def wrap_multilines(text, multilines, width):
-    wraps = wrap(text, width)
+def wrap_multilines(text, multilines, width, keep=()):
+    wraps = wrap(text, width, keep=keep)
     return distribute_multilines(wraps, multilines)
 
 
+def level_segments(multilines):
+    # per level (start, stop, line) inside wrapped line, consecutive
+    # multis of one line are merged, lines on one level do not
+    # overlap. Empty slices from whitespace dropped between lines
+    # only add height, same as in ascii
+    rows = defaultdict(dict)
+    for multi in multilines:
+        for line in multi.lines:
+            row = rows[line.level]
+            if multi.start >= multi.stop:
+                continue
+            if line in row:
+                start, _ = row[line]
+                row[line] = (start, multi.stop)
+            else:
+                row[line] = (multi.start, multi.stop)
+
+    for level in range(max(rows) + 1):
+        yield sorted(
+            (start, stop, line)
+            for line, (start, stop) in rows[level].items()
+        )
+
+
 ########
 #
 #   NER
@@ -197,159 +532,644 @@ def wrap_multilines(text, multilines, width):
 ######
 
 
-def format_span_box_markup(text, spans, palette=PALETTE):
-    spans = order_spans(prepare_spans(spans))
+class Tags(dict):
+    # Per render table of finished opening tags, build is called once
+    # per key, hot loops do one dict lookup
+
+    def __init__(self, build):
+        super(Tags, self).__init__()
+        self.build = build
+
+    def __missing__(self, key):
+        tag = self.build(key)
+        self[key] = tag
+        return tag
+
+
+BOX_STYLE = (
+    'padding: 2px; '
+    'border-radius: 4px; '
+    'border: 1px solid {border}; '
+    'background: {background}'
+)
+BOX_LABEL_STYLE = (
+    'vertical-align: middle; '
+    'margin-left: 2px; '
+    'font-size: 0.7em; '
+    'color: {color};'
+)
+
+
+def box_rules(spans, palette):
+    classes = {}
+    rules = []
+    for _, _, type in spans:
+        color = palette.get(type)
+        if color in classes:
+            continue
+        index = len(classes)
+        classes[color] = index
+        rules.append((
+            'c%d' % index,
+            BOX_STYLE.format(
+                background=color.background.value,
+                border=color.border.value
+            )
+        ))
+        rules.append((
+            't%d' % index,
+            BOX_LABEL_STYLE.format(
+                color=color.text.value
+            )
+        ))
+    return classes, rules
+
+
+def box_tags(palette, classes=None):
+    def build(type):
+        color = palette.get(type)
+        if classes is not None:
+            index = classes[color]
+            return (
+                '<span class="c%d">' % index,
+                '<span class="t%d">' % index
+            )
+        return (
+            '<span style="%s">' % BOX_STYLE.format(
+                background=color.background.value,
+                border=color.border.value
+            ),
+            '<span style="%s">' % BOX_LABEL_STYLE.format(
+                color=color.text.value
+            )
+        )
+
+    return Tags(build)
+
+
+@profiled
+def format_span_box_markup(text, spans, palette=PALETTE, stylesheet=False):
+    spans = lazy('prepare_spans', prepare_spans(spans))
+    spans = timed('order_spans', order_spans, spans)
+    count('spans', len, spans)
+
+    scope, classes = None, None
+    if stylesheet:
+        classes, rules = box_rules(spans, palette)
+        scope = css_scope(rules)
+        yield from format_css(scope, rules)
 
     yield (
-        '<div class="tex2jax_ignore" '
-        'style="white-space: pre-wrap">'  # render spaces
+        '<div class="{classes}" '
+        'style="white-space: pre-wrap">'.format(  # render spaces
+            classes=' '.join(filter(None, ['tex2jax_ignore', scope]))
+        )
     )
+    tags = box_tags(palette, classes)
     for text, span in span_text_sections(text, spans):
         text = escape(text)
         if not span:
             yield text
             continue
 
-        color = palette.get(span.type)
-        yield (
-            '<span style="'
-            'padding: 2px; '
-            'border-radius: 4px; '
-            'border: 1px solid {border}; '
-            'background: {background}'
-            '">'.format(
-                background=color.background.value,
-                border=color.border.value
-            )
-        )
+        _, _, type = span
+        box, label = tags[type]
+        yield box
         yield text
-        if span.type:
-            yield (
-                '<span style="'
-                'vertical-align: middle; '
-                'margin-left: 2px; '
-                'font-size: 0.7em; '
-                'color: {color};'
-                '">'.format(
-                    color=color.text.value
-                )
-            )
-            yield span.type
+        if type:
+            yield label
+            yield type
             yield '</span>'
         yield '</span>'
     yield '</div>'
 
 
+BLOCK_STYLE = (
+    'display: inline-block; '
+    'vertical-align: top'
+)
+MULTI_STYLE = (
+    'display: inline-block; '
+    'vertical-align: top; position: relative; '
+    'margin-bottom: {margin}px'
+)
+UNDERLINE_STYLE = 'border-bottom: {line_width}px solid {color}'
+PADDING_STYLE = 'padding-bottom: {padding}px'
+LINE_LABEL_STYLE = (
+    'font-size: {label_size}px; line-height: 1; '
+    'white-space: nowrap; '
+    'text-shadow: 1px 1px 0px {background}; '
+    'position: absolute; left: 0; '
+    'bottom: {bottom}px'
+)
+
+
+def line_rules(multilines, palette, line_gap, line_width,
+               label_size, background):
+    levels = [
+        line.level
+        for multi in multilines
+        for line in multi.lines
+    ]
+    height = max(levels, default=-1) + 1
+
+    level_width = line_gap + line_width
+    rules = [('b', BLOCK_STYLE)]
+    for level in range(height):
+        margin = (level + 1) * level_width
+        padding = line_gap + level * level_width
+        bottom = -level * level_width - line_gap
+        rules.extend([
+            ('m%d' % level, MULTI_STYLE.format(margin=margin)),
+            ('p%d' % level, PADDING_STYLE.format(padding=padding)),
+            ('l%d' % level, LINE_LABEL_STYLE.format(
+                label_size=label_size,
+                background=background,
+                bottom=bottom
+            ))
+        ])
+
+    classes = {}
+    for multi in multilines:
+        for line in multi.lines:
+            color = palette.get(line.type)
+            if color in classes:
+                continue
+            index = len(classes)
+            classes[color] = index
+            rules.append((
+                'c%d' % index,
+                UNDERLINE_STYLE.format(
+                    line_width=line_width,
+                    color=color.line.value
+                )
+            ))
+    return classes, rules
+
+
+def line_tags(palette, line_gap, line_width, label_size,
+              background, classes=None):
+    stylesheet = classes is not None
+    level_width = line_gap + line_width
+
+    def build_multi(level):
+        if stylesheet:
+            return '<span class="m%d">' % level
+        margin = (level + 1) * level_width
+        return '<span style="%s">' % MULTI_STYLE.format(margin=margin)
+
+    def build_underline(key):
+        type, level = key
+        color = palette.get(type)
+        if stylesheet:
+            return '<span class="c%d p%d">' % (classes[color], level)
+        padding = line_gap + level * level_width
+        return '<span style="%s; %s">' % (
+            UNDERLINE_STYLE.format(
+                line_width=line_width,
+                color=color.line.value
+            ),
+            PADDING_STYLE.format(padding=padding)
+        )
+
+    def build_label(level):
+        if stylesheet:
+            return '<span class="l%d">' % level
+        bottom = -level * level_width - line_gap
+        return '<span style="%s">' % LINE_LABEL_STYLE.format(
+            label_size=label_size,
+            background=background,
+            bottom=bottom
+        )
+
+    if stylesheet:
+        block = '<span class="b">'
+    else:
+        block = '<span style="%s">' % BLOCK_STYLE
+    return block, Tags(build_multi), Tags(build_underline), Tags(build_label)
+
+
+def format_span_line(offset, line, multilines, block, multis,
+                     underlines, labels):
+    yield '<div>'  # line block
+    for text, multi in span_text_sections(line, multilines):
+        text = escape(text)
+        if not multi:
+            yield block
+            yield text
+            yield '</span>'
+            continue
+
+        lines = multi.lines
+        yield multis[lines[-1].level]  # lines are sorted by level
+        for line in lines:
+            yield underlines[line.type, line.level]
+        yield text
+        for _ in lines:
+            yield '</span>'
+
+        for line in lines:
+            if not line.type or offset + multi.start != line.start:
+                continue
+            yield labels[line.level]
+            yield line.type
+            yield '</span>'
+
+        yield '</span>'  # close relative
+    yield '</div>'  # close line
+
+
+def span_line_blocks(text, multilines, palette, width, line_gap,
+                     line_width, label_size, background, classes=None,
+                     keep=()):
+    # fragments of every wrapped line, lines are independent blocks
+    block, multis, underlines, labels = line_tags(
+        palette, line_gap, line_width, label_size,
+        background, classes
+    )
+    wraps = wrap_multilines(text, multilines, width, keep)
+    wraps = lazy('wrap_multilines', wraps, 'lines')
+    for offset, line, multilines in wraps:
+        yield format_span_line(
+            offset, line, multilines,
+            block, multis, underlines, labels
+        )
+
+
+def format_span_lines(text, multilines, palette, width, line_gap,
+                      line_width, label_size, background, classes=None,
+                      keep=()):
+    blocks = span_line_blocks(
+        text, multilines, palette, width, line_gap,
+        line_width, label_size, background, classes, keep
+    )
+    for block in blocks:
+        yield from block
+
+
+def line_markup_open(scope=None):
+    return (
+        '<div class="{classes}" style="'
+        'white-space: pre-wrap'
+        '">'.format(
+            classes=' '.join(filter(None, ['tex2jax_ignore', scope]))
+        )
+    )
+
+
+@profiled
 def format_span_line_markup(text, spans, palette=PALETTE,
+                            width=80, line_gap=8, line_width=3,
+                            label_size=11, background='white',
+                            stylesheet=False, keep_spans=False):
+    spans = lazy('prepare_spans', prepare_spans(spans))
+    spans = timed('order_spans', order_spans, spans)
+    multilines = timed('get_multilines', list, get_multilines(spans))
+    count('spans', len, spans)
+    count('max_level', max_level, multilines)
+    keep = keep_ranges(spans) if keep_spans else ()
+
+    scope, classes = None, None
+    if stylesheet:
+        classes, rules = line_rules(
+            multilines, palette, line_gap, line_width,
+            label_size, background
+        )
+        scope = css_scope(rules)
+        yield from format_css(scope, rules)
+
+    yield line_markup_open(scope)
+    yield from format_span_lines(
+        text, multilines, palette, width, line_gap,
+        line_width, label_size, background, classes, keep
+    )
+    yield '</div>'
+
+
+def stream_span_line_markup(text, spans, palette=PALETTE,
                             width=80, line_gap=8, line_width=3,
                             label_size=11, background='white'):
-    spans = order_spans(prepare_spans(spans))
-    multilines = list(get_multilines(spans))
+    spans = check_spans_order(prepare_spans(spans))
+    multilines = get_multilines(spans)
 
-    level_width = line_gap + line_width
-    yield (
-        '<div class="tex2jax_ignore" style="'
-        'white-space: pre-wrap'
-        '">'
+    yield '<div class="tex2jax_ignore" style="white-space: pre-wrap">'
+    yield from format_span_lines(
+        text, multilines, palette, width, line_gap,
+        line_width, label_size, background
     )
-    for offset, line, multilines in wrap_multilines(text, multilines, width):
-        yield '<div>'  # line block
-        for text, multi in span_text_sections(line, multilines):
-            text = escape(text)
-            if not multi:
-                yield (
-                    '<span style="display: inline-block; '
-                    'vertical-align: top">'
-                )
-                yield text
-                yield '</span>'
+    yield '</div>'
+
+
+def format_span_ascii_lines(text, multilines, width, keep=()):
+    wraps = wrap_multilines(text, multilines, width, keep)
+    wraps = lazy('wrap_multilines', wraps, 'lines')
+    for offset, line, multilines in wraps:
+        yield line.replace('\t', ' ')
+
+        if multilines:
+            # rows by level, filled with slice assignment. Slices of
+            # multis in whitespace dropped between lines are empty or
+            # reversed, they only add height
+            width = len(line)
+            rows = {}
+            labels = []
+            for multi in multilines:
+                start, stop = multi.start, multi.stop
+                block = '─' * (stop - start) if start < stop else None
+                for line in multi.lines:
+                    row = rows.get(line.level)
+                    if row is None:
+                        row = rows[line.level] = [' '] * width
+                    if block:
+                        row[start:stop] = block
+                        if line.type and offset + start == line.start:
+                            labels.append((start, line))
+
+            # labels after blocks, label may cover next multis
+            for start, line in labels:
+                size = line.stop - line.start
+                space = width - start
+                type = line.type[:min(size, space)]
+                rows[line.level][start:start + len(type)] = type
+
+            for level in range(max(rows) + 1):
+                row = rows.get(level)
+                if row is None:
+                    yield ' ' * width
+                else:
+                    yield ''.join(row)
+
+
+@profiled
+def format_span_ascii_markup(text, spans, width=70, keep_spans=False):
+    spans = lazy('prepare_spans', prepare_spans(spans))
+    spans = timed('order_spans', order_spans, spans)
+    multilines = timed('get_multilines', list, get_multilines(spans))
+    count('spans', len, spans)
+    count('max_level', max_level, multilines)
+    keep = keep_ranges(spans) if keep_spans else ()
+    yield from format_span_ascii_lines(text, multilines, width, keep)
+
+
+def stream_span_ascii_markup(text, spans, width=70):
+    spans = check_spans_order(prepare_spans(spans))
+    multilines = get_multilines(spans)
+    yield from format_span_ascii_lines(text, multilines, width)
+
+
+########
+#
+#   ANSI
+#
+#####
+
+
+def format_span_ansi_lines(text, multilines, width, palette, colors, keep=()):
+    escapes = Escapes(colors)
+    wraps = wrap_multilines(text, multilines, width, keep)
+    for offset, line, multilines in wraps:
+        line = line.replace('\t', ' ')
+        if not multilines:
+            yield line
+            continue
+
+        parts, previous = [], 0
+        for multi in multilines:
+            if multi.start >= multi.stop:
                 continue
+            top = min(multi.lines, key=lambda _: _.level)
+            color = palette.get(top.type)
+            parts.append(line[previous:multi.start])
+            parts.append(escapes.paint(line[multi.start:multi.stop], color.text))
+            previous = multi.stop
+        parts.append(line[previous:])
+        yield ''.join(parts)
+
+        width = len(line)
+        for segments in level_segments(multilines):
+            parts, previous = [], 0
+            for start, stop, line in segments:
+                color = palette.get(line.type)
+                parts.append(' ' * (start - previous))
+                size = 0
+                if line.type and offset + start == line.start:
+                    size = min(line.stop - line.start, width - start)
+                    parts.append(escapes.paint(line.type[:size], color.text))
+                    size = len(line.type[:size])
+                parts.append(escapes.paint('─' * (stop - start - size), color.line))
+                previous = stop
+            parts.append(' ' * (width - previous))
+            yield ''.join(parts)
+
+
+def format_span_ansi_markup(text, spans, width=None, palette=PALETTE,
+                            colors=None, keep_spans=False):
+    if width is None:
+        width = terminal_width()
+    spans = order_spans(prepare_spans(spans))
+    multilines = list(get_multilines(spans))
+    keep = keep_ranges(spans) if keep_spans else ()
+    yield from format_span_ansi_lines(
+        text, multilines, width,
+        palette, colors, keep
+    )
+
+
+########
+#
+#   SVG
+#
+#####
+
+
+SVG_LINE_LABEL = (
+    '<text x="%.1f" y="%.1f" fill="%s" stroke="%s" stroke-width="3" '
+    'paint-order="stroke">%s</text>'
+)
 
-            level = max(_.level for _ in multi.lines)
-            margin = (level + 1) * level_width
-            yield (
-                '<span style="display: inline-block; '
-                'vertical-align: top; position: relative; '
-                'margin-bottom: {margin}px">'.format(
-                    margin=margin
-                )
-            )
 
-            for line in multi.lines:
-                padding = line_gap + line.level * level_width
+def span_svg_items(text, multilines, palette, width, font_size,
+                   char_width, line_gap, line_width, label_size,
+                   background, keep=()):
+    # flat primitives: text per wrapped line, rect per line segment,
+    # label background is drawn as stroke
+    level_width = line_gap + line_width
+    texts, rects, labels = [], [], []
+    top, right = 0, 0
+    wraps = wrap_multilines(text, multilines, width, keep)
+    for offset, line, multilines in wraps:
+        line = line.replace('\t', ' ')
+        right = max(right, len(line) * char_width)
+        texts.append('<text x="0" y="%.1f">%s</text>' % (
+            top + font_size, escape(line)
+        ))
+        top += font_size * 1.25
+        if not multilines:
+            continue
+
+        for level, segments in enumerate(level_segments(multilines)):
+            y = top + line_gap + level * level_width
+            for start, stop, line in segments:
                 color = palette.get(line.type)
-                yield (
-                    '<span style="'
-                    'border-bottom: {line_width}px solid {color}; '
-                    'padding-bottom: {padding}px'
-                    '">'.format(
-                        line_width=line_width,
-                        padding=padding,
-                        color=color.line.value
+                rects.append(
+                    '<rect x="%.1f" y="%.1f" width="%.1f" height="%d" fill="%s"/>' % (
+                        start * char_width, y, (stop - start) * char_width,
+                        line_width, color.line.value
                     )
                 )
-            yield text
-            for _ in multi.lines:
-                yield '</span>'
-
-            for line in multi.lines:
-                if not line.type or offset + multi.start != line.start:
-                    continue
-
-                bottom = -line.level * level_width - line_gap
-                yield (
-                    '<span style="'
-                    'font-size: {label_size}px; line-height: 1; '
-                    'white-space: nowrap; '
-                    'text-shadow: 1px 1px 0px {background}; '
-                    'position: absolute; left: 0; '
-                    'bottom: {bottom}px">'.format(
-                        label_size=label_size,
-                        background=background,
-                        bottom=bottom
+                if line.type and offset + start == line.start:
+                    labels.append(SVG_LINE_LABEL % (
+                        start * char_width, y + line_width + label_size,
+                        color.text.value, background, escape(line.type)
+                    ))
+                    # label may be longer than line, svg clips overflow
+                    right = max(
+                        right,
+                        start * char_width + len(line.type) * label_size * 0.6
                     )
-                )
-                yield line.type
-                yield '</span>'
+        top += (level + 1) * level_width + label_size * 1.25
 
-            yield '</span>'  # close relative
-        yield '</div>'  # close line
-    yield '</div>'
+    return texts, rects, labels, ceil(right), ceil(top)
 
 
-def format_span_ascii_markup(text, spans, width=70):
+def format_span_svg_markup(text, spans, palette=PALETTE,
+                           width=80, font_size=13, char_width=None,
+                           line_gap=8, line_width=3, label_size=11,
+                           background='white', keep_spans=False):
+    # flat svg instead of nested inline blocks, level assignment and
+    # wrapping are same as in line markup. Char width is estimated
+    # for monospace font
+    if char_width is None:
+        char_width = font_size * 0.6
     spans = order_spans(prepare_spans(spans))
     multilines = list(get_multilines(spans))
+    keep = keep_ranges(spans) if keep_spans else ()
 
-    for offset, line, multilines in wrap_multilines(text, multilines, width):
-        yield line.replace('\t', ' ')
+    texts, rects, labels, width, height = span_svg_items(
+        text, multilines, palette, width, font_size,
+        char_width, line_gap, line_width, label_size,
+        background, keep
+    )
+    yield (
+        '<svg xmlns="http://www.w3.org/2000/svg" class="tex2jax_ignore" '
+        'width="%d" height="%d" viewBox="0 0 %d %d" '
+        'font-family="monospace" font-size="%d" style="white-space: pre">' % (
+            width, height, width, height, font_size
+        )
+    )
+    yield from texts
+    yield from rects
+    yield '<g font-size="%d">' % label_size  # labels on top
+    yield from labels
+    yield '</g>'
+    yield '</svg>'
 
-        if multilines:
-            height = max(
-                line.level
-                for multi in multilines
-                for line in multi.lines
-            ) + 1
-            width = len(line)
-            matrix = [
-                [' ' for _ in range(width)]
-                for row in range(height)
-            ]
-            for multi in multilines:
-                for line in multi.lines:
-                    for x in range(multi.start, multi.stop):
-                        matrix[line.level][x] = '─'
-            for multi in multilines:
-                for line in multi.lines:
-                    if line.type and offset + multi.start == line.start:
-                        size = line.stop - line.start
-                        space = width - multi.start
-                        type = line.type[:min(size, space)]
-                        for x, char in enumerate(type):
-                            x = multi.start + x
-                            matrix[line.level][x] = char
-            for row in matrix:
-                yield ''.join(row)
+
+########
+#
+#   PAGE
+#
+#####
+
+
+def shift_spans(spans, offset):
+    return [
+        (start - offset, stop - offset, type)
+        for start, stop, type in spans
+    ]
+
+
+def text_pages(text, spans, page_size):
+    # cut text at newlines not covered by spans, every page except
+    # last has at least page_size lines
+    spans = [tuple(_) for _ in order_spans(prepare_spans(spans))]
+    start, first, index, reach, lines = 0, 0, 0, 0, 0
+    position = text.find('\n')
+    while position >= 0:
+        lines += 1
+        while index < len(spans) and spans[index][0] <= position:
+            reach = max(reach, spans[index][1])
+            index += 1
+        if lines >= page_size and reach <= position:
+            stop = position + 1
+            yield text[start:stop], shift_spans(spans[first:index], start)
+            start, first, lines = stop, index, 0
+        position = text.find('\n', position + 1)
+
+    if start < len(text) or not start:
+        yield text[start:], shift_spans(spans[first:], start)
+
+
+def page_span_box_markup(text, spans, page_size=100, **kwargs):
+    for text, spans in text_pages(text, spans, page_size):
+        yield format_span_box_markup(text, spans, **kwargs)
+
+
+def page_span_line_markup(text, spans, page_size=100, palette=PALETTE,
+                          width=80, line_gap=8, line_width=3,
+                          label_size=11, background='white',
+                          stylesheet=False, keep_spans=False):
+    # page is page_size wrapped lines, levels are assigned once for
+    # whole text so pages look same as one markup
+    spans = order_spans(prepare_spans(spans))
+    multilines = list(get_multilines(spans))
+    keep = keep_ranges(spans) if keep_spans else ()
+
+    scope, classes, css = None, None, []
+    if stylesheet:
+        classes, rules = line_rules(
+            multilines, palette, line_gap, line_width,
+            label_size, background
+        )
+        scope = css_scope(rules)
+        css = list(format_css(scope, rules))
+
+    def page(blocks):
+        yield from css
+        yield line_markup_open(scope)
+        for block in blocks:
+            yield from block
+        yield '</div>'
+
+    blocks = span_line_blocks(
+        text, multilines, palette, width, line_gap,
+        line_width, label_size, background, classes, keep
+    )
+    buffer, empty = [], True
+    for block in blocks:
+        buffer.append(block)
+        if len(buffer) >= page_size:
+            yield page(buffer)
+            buffer, empty = [], False
+    if buffer or empty:
+        yield page(buffer)
+
+
+#######
+#
+#   WRITE
+#
+#####
+
+
+def write_span_box_markup(text, spans, file, size=2 ** 16, **kwargs):
+    lines = format_span_box_markup(text, spans, **kwargs)
+    write_lines(lines, file, size)
+
+
+def write_span_line_markup(text, spans, file, size=2 ** 16, **kwargs):
+    lines = format_span_line_markup(text, spans, **kwargs)
+    write_lines(lines, file, size)
+
+
+def write_span_svg_markup(text, spans, file, size=2 ** 16, **kwargs):
+    lines = format_span_svg_markup(text, spans, **kwargs)
+    write_lines(lines, file, size)
+
+
+def write_span_ascii_markup(text, spans, file, size=2 ** 16, **kwargs):
+    lines = format_span_ascii_markup(text, spans, **kwargs)
+    write_lines(lines, file, size, separator='\n')
 
 
 ########
@@ -359,16 +1179,32 @@ def format_span_ascii_markup(text, spans, width=70):
 #######
 
 
-def show_span_box_markup(text, spans, **kwargs):
+def show_span_box_markup(text, spans, page_size=None, **kwargs):
+    if page_size:
+        pages = page_span_box_markup(text, spans, page_size, **kwargs)
+        return show_html_pages(pages)
     lines = format_span_box_markup(text, spans, **kwargs)
     show_html(lines)
 
 
-def show_span_line_markup(text, spans, **kwargs):
+def show_span_line_markup(text, spans, page_size=None, **kwargs):
+    if page_size:
+        pages = page_span_line_markup(text, spans, page_size, **kwargs)
+        return show_html_pages(pages)
     lines = format_span_line_markup(text, spans, **kwargs)
     show_html(lines)
 
 
+def show_span_svg_markup(text, spans, **kwargs):
+    lines = format_span_svg_markup(text, spans, **kwargs)
+    show_html(lines)
+
+
 def show_span_ascii_markup(text, spans, **kwargs):
     for line in format_span_ascii_markup(text, spans, **kwargs):
         print(line)
+
+
+def show_span_ansi_markup(text, spans, file=None, **kwargs):
+    lines = format_span_ansi_markup(text, spans, **kwargs)
+    show_ansi(lines, file)
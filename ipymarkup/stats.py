@@ -0,0 +1,193 @@
+
+from threading import local, Lock
+from functools import wraps
+from contextlib import contextmanager
+from collections.abc import Iterator
+from timeit import default_timer as timer
+
+from .record import Record
+
+
+# Formatters report per stage exclusive wall time and counters to
+# hooks. Hooks added with add_stats_hook are global, render_stats
+# collectors are thread local and see only renders started in own
+# thread. Without hooks formatter call costs one list check and two
+# thread local lookups, every stage one thread local lookup
+
+
+HOOKS = []  # replaced on change, never mutated
+LOCK = Lock()
+STATE = local()
+
+EMIT = 'emit'  # formatter own code, markup emission
+DONE = object()
+
+
+class RenderStats(Record):
+    __attributes__ = ['format', 'time', 'stages', 'counters']
+    __slots__ = ['format', 'time', 'stages', 'counters', 'stack']
+
+    def __init__(self, format, time=0, stages=None, counters=None):
+        self.format = format
+        self.time = time
+        self.stages = stages or {}
+        self.counters = counters or {}
+        self.stack = []  # time of nested stages
+
+    def enter(self):
+        self.stack.append(0)
+        return timer()
+
+    def exit(self, name, start):
+        time = timer() - start
+        nested = self.stack.pop()
+        self.stages[name] = self.stages.get(name, 0) + time - nested
+        if self.stack:
+            self.stack[-1] += time
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+def current():
+    return getattr(STATE, 'stats', None)
+
+
+def collectors():
+    return getattr(STATE, 'collectors', ())
+
+
+#######
+#
+#   STAGE
+#
+#####
+
+
+def timed(name, function, *args):
+    stats = current()
+    if stats is None:
+        return function(*args)
+
+    start = stats.enter()
+    try:
+        return function(*args)
+    finally:
+        stats.exit(name, start)
+
+
+def iterate(stats, name, items, counter):
+    size = 0
+    while True:
+        start = stats.enter()
+        try:
+            item = next(items, DONE)
+        finally:
+            stats.exit(name, start)
+        if item is DONE:
+            break
+        size += 1
+        yield item
+
+    if counter:
+        stats.count(counter, size)
+
+
+def lazy(name, items, counter=None):
+    # time is spent when items are consumed, only iterators are
+    # wrapped, SpanArray and lists keep their type
+    stats = current()
+    if stats is None or not isinstance(items, Iterator):
+        return items
+    return iterate(stats, name, items, counter)
+
+
+def count(name, function, *args):
+    stats = current()
+    if stats is not None:
+        stats.count(name, function(*args))
+
+
+#######
+#
+#   RENDER
+#
+######
+
+
+def render(function, args, kwargs, hooks):
+    stats = RenderStats(function.__name__)
+    items = function(*args, **kwargs)
+    previous = current()
+    size = 0
+    while True:
+        STATE.stats = stats
+        start = stats.enter()
+        try:
+            item = next(items, DONE)
+        finally:
+            stats.exit(EMIT, start)
+            STATE.stats = previous
+        if item is DONE:
+            break
+        if item.isascii():
+            size += len(item)
+        else:
+            size += len(item.encode('utf8'))
+        yield item
+
+    stats.count('bytes', size)
+    stats.time = sum(stats.stages.values())
+    for hook in hooks:
+        hook(stats)
+
+
+def profiled(function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        # hooks are taken on call, render may be consumed in other
+        # thread
+        local = collectors()
+        if not HOOKS and not local:
+            return function(*args, **kwargs)
+        return render(function, args, kwargs, HOOKS + list(local))
+
+    return wrapper
+
+
+#######
+#
+#   HOOK
+#
+#####
+
+
+def add_stats_hook(hook):
+    global HOOKS
+
+    with LOCK:
+        HOOKS = HOOKS + [hook]
+
+
+def remove_stats_hook(hook):
+    global HOOKS
+
+    with LOCK:
+        hooks = list(HOOKS)
+        hooks.remove(hook)
+        HOOKS = hooks
+
+
+@contextmanager
+def render_stats(hook=None):
+    # RenderStats of formatter calls inside block in current thread go
+    # to hook or to yielded list
+    collected = []
+    if hook is None:
+        hook = collected.append
+    previous = collectors()
+    STATE.collectors = previous + (hook,)
+    try:
+        yield collected
+    finally:
+        STATE.collectors = previous
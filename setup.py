@@ -28,5 +28,9 @@ setup(
     install_requires=[
         # 'IntervalTree' object has no attribute 'search'
         'intervaltree>=3'
-    ]
+    ],
+    extras_require={
+        # SpanArray, DepArray
+        'numpy': ['numpy']
+    }
 )